@@ -38,14 +38,12 @@ from selenium.webdriver.firefox.options import Options
 
 import pickle  # for persisting dataframe
 
-import logging  # Added for file logging
+from logpipe import LogPipeline  # queued UI + rotating file logging
 
 CONFIG_FILE = "config.json"
 CONTACTS_FILE = "contacts.pkl"
-LOG_FILE = "dialer.log"  # Added log file
-
-# Setup logging to file
-logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format='[%(asctime)s] %(message)s', datefmt='%H:%M:%S')
+LOG_UI_LINES = 1000  # log widget keeps only the newest lines
+LOG_DRAIN_MS = 100
 
 
 def sanitize_selector(raw: str) -> str:
@@ -70,6 +68,9 @@ class ContactDialerApp(tk.Tk):
         self.geometry("900x720")
         self.resizable(False, False)
 
+        # logging: workers only enqueue, the Tk thread drains on a timer
+        self.log_pipe = LogPipeline()
+
         # init audio
         pygame.mixer.init()
 
@@ -88,6 +89,7 @@ class ContactDialerApp(tk.Tk):
         # load config and build UI
         self._load_or_init_config()
         self._build_ui()  # Moved before _load_persisted_contacts
+        self._drain_log()
         self._populate_audio_devices()
         self._populate_settings()
         self._load_persisted_contacts()  # Moved after _build_ui
@@ -322,13 +324,20 @@ class ContactDialerApp(tk.Tk):
                 self.output_cb.set(name)
 
     def _append_log(self, msg):
-        self.log_txt.config(state="normal")
-        ts = time.strftime("%H:%M:%S")
-        full_msg = f"[{ts}] {msg}"
-        self.log_txt.insert(tk.END, full_msg + "\n")
-        self.log_txt.see(tk.END)
-        self.log_txt.config(state="disabled")
-        logging.info(msg)  # Log to file without timestamp (since logging adds it)
+        """Safe from any thread; the widget is updated by _drain_log."""
+        self.log_pipe.log(msg)
+
+    def _drain_log(self):
+        lines = self.log_pipe.drain()
+        if lines:
+            self.log_txt.config(state="normal")
+            self.log_txt.insert(tk.END, "\n".join(lines) + "\n")
+            excess = int(self.log_txt.index("end-1c").split(".")[0]) - 1 - LOG_UI_LINES
+            if excess > 0:
+                self.log_txt.delete("1.0", f"{excess + 1}.0")
+            self.log_txt.see(tk.END)
+            self.log_txt.config(state="disabled")
+        self.after(LOG_DRAIN_MS, self._drain_log)
 
     def _populate_audio_devices(self):
         self.output_devices = []
@@ -12,34 +12,74 @@ Complete Contact Dialer Application – Revised:
 – Run Firefox in headless mode
 – Fixed issue with cat_cb AttributeError by reordering UI initialization
 – Optimized delays: retry delay 3s, inter-call delay 0.5s
+– Parallel campaign: one dialing session per account in config["sessions"]
+– Logged-in sessions are pooled and reused; re-login only when health check fails
+– Call outcomes are journaled (SQLite/WAL) instead of re-pickling the whole list;
+  interrupted campaigns can be resumed
+– Virtualized contact list; a finished call only redraws its own row
+– Indexed contact store: phone/category indexes and status arrays, no frame copies
+– Streaming Excel/CSV/Parquet import with progress; unchanged files are not re-parsed
+– Audio messages are decoded once (LRU + on-disk PCM cache) and played from memory
+– Queued logging: bounded log widget drained in batches, rotating dialer.jsonl file
+– Call detail records in date-partitioned Parquet with an answer-rate report
+– Busy/unanswered contacts are redialed with per-outcome backoff (config["redial"])
+– Calling windows checked before every dial; campaigns pause and resume on schedule
+– Config defaults moved to settings.py; headless daemon.py runs campaigns behind a JSON API
+– mockpanel.py (local stand-in panel) and bench.py (calls/hour, detection latency, stage timings)
+– Dialing is one script round-trip on cached dial-pad elements, without the fixed 0.5s wait
+– Numbers normalized (+98/0098, Persian/Arabic digits, separators); imports are merged
+  into the list without repeats and the merges written to import_merged.csv
+– Do-not-call index (memory-mapped dnc.npy): lists are filtered on import and every
+  number is checked again right before dialing
+– Pipelined dialing: the next contact is staged while a call rings, journal and CDR
+  writes happen on background threads, no fixed pause between calls
+– Audio plays on the selected output device without dead air between repeats and
+  stops at once when the call is hung up or drops
+– Per-stage latency histograms and call counters on a Prometheus /metrics endpoint
+  and a live throughput tab
+– Opt-in Chrome trace (config["trace"]["file"]) of every WebDriver call and loop wait
+– Optional persistent Firefox profile per line (config["browser"]["profile_dir"]):
+  a remembered panel session skips the login form
+– Pluggable dialer backends (backends.py): Selenium, or the panel's HTTP/WebSocket API
+  from one asyncio loop without a browser (config["backend"] = "api")
+– Shared-browser mode: every line as an isolated tab of one lightweight Firefox
+  (config["browser"]["shared"]); "lite" turns off images and web fonts
+– Optional answer check on the line input (config["audio"]["detect_answer"], vad.py):
+  voicemail greetings and network announcements are hung up and redialed later
 """
 
+import collections
 import os
-import json
 import re
 import threading
 import time
-import datetime
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
-import pandas as pd
-import pygame
+import numpy as np
 
 import keyboard
 import pyperclip
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.firefox.options import Options
-
-import pickle  # for persisting dataframe
-
-CONFIG_FILE = "config.json"
-CONTACTS_FILE = "contacts.pkl"
+from sessions import SessionPool
+from settings import CONFIG_FILE, load_config, save_config
+from campaign import CampaignEngine
+from importer import import_contacts
+from audio import (AudioCache, init_mixer, input_devices, open_line_monitor, output_devices,
+                   play_into_call)
+from logpipe import LogPipeline
+from cdr import call_record
+from dnc import read_numbers
+from metrics import METRICS, serve_metrics
+from tracing import TRACER, start_from_config
+from widgets import VirtualListbox
+from workspace import Workspace
+
+LOG_UI_LINES = 1000  # log widget keeps only the newest lines
+LOG_DRAIN_MS = 100
+STATS_REFRESH_MS = 1000
+THROUGHPUT_WINDOW = 300  # seconds of history behind the calls/hour figure
 
 
 def sanitize_selector(raw: str) -> str:
@@ -64,87 +104,63 @@ class ContactDialerApp(tk.Tk):
         self.geometry("900x720")
         self.resizable(False, False)
 
-        # init audio
-        pygame.mixer.init()
+        # logging: workers only enqueue, the Tk thread drains on a timer
+        self.log_pipe = LogPipeline()
 
         # call control
         self.play_audio_call_var = tk.BooleanVar(value=True)
-        self.hangup_event = threading.Event()
-        self.call_active = False
+        self.audio_lock = threading.Lock()  # one mixer, shared by all lines
 
         # state
         self.config_data = {}
-        self.contacts_df = pd.DataFrame()
-        self.filtered_df = pd.DataFrame()
         self.audio_path = None
-        self.driver = None
+        self.engine = None
 
         # load config and build UI
         self._load_or_init_config()
+
+        # contact list, journal, CDRs and do-not-call index (shared with daemon.py)
+        self.ws = Workspace(self.config_data, self._append_log)
+        self.store, self.contacts_lock = self.ws.store, self.ws.lock
+        self.journal, self.cdr, self.dnc = self.ws.journal, self.ws.cdr, self.ws.dnc
+        self.view_rows = self.store.rows()  # store rows shown in the list, ascending
+
+        # init audio
+        audio_cfg = self.config_data["audio"]
+        init_mixer(audio_cfg["sample_rate"], audio_cfg["output_index"])
+        self.audio_cache = AudioCache(max_bytes=audio_cfg["cache_mb"] * 1024 * 1024)
+
+        self.pool = SessionPool(self.config_data, self._append_log)
         self._build_ui()  # Moved before _load_persisted_contacts
+        self._drain_log()
+        self._start_metrics()
+        self._refresh_stats()
+        if start_from_config(self.config_data):
+            self._append_log(f"🧵 ردیابی در {self.config_data['trace']['file']} ثبت می‌شود.")
         self._populate_audio_devices()
         self._populate_settings()
+        open_line_monitor(self.config_data["audio"], self._append_log)
         self._load_persisted_contacts()  # Moved after _build_ui
+        self._preload_audio_files()
 
         # global hotkey: Ctrl+Shift+C
         keyboard.add_hotkey(
             "ctrl+shift+c",
             lambda: self.after(0, self._hotkey_manual_call)
         )
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+    def _on_close(self):
+        if self.engine:
+            self.engine.stop()
+        threading.Thread(target=self.pool.close, daemon=True).start()
+        self.ws.close()
+        TRACER.stop()
+        self.log_pipe.close()
+        self.destroy()
 
     def _load_or_init_config(self):
-        default = {
-            "site_url": "",
-            "username": "",
-            "password": "",
-            "selectors": {
-                "username": "input[name=\"login\"]",
-                "password": "input[name=\"password\"]",
-                "login_button": "button[type=\"submit\"]",
-                "dialer_button": "button#dialer-button",
-                "phone_input": "input[name=\"phone\"]",
-                "call_button": "button.call-now",
-                "hangup_button": "",
-                "pause_indicator": ".mdi-pause"
-            },
-            "schedule": {
-                "start": "09:00",
-                "end": "18:00"
-            },
-            "audio": {
-                "repeat": 1,
-                "delay": 5,
-                "output_index": None
-            },
-            "detect": {
-                "ring_timeout": 15,  # Reduced from 25s
-                "off_busy_threshold": 3.0,
-                "answered_grace": 0.4
-            }
-        }
-
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, encoding="utf-8") as f:
-                user_cfg = json.load(f)
-            self.config_data = self._deep_merge(default, user_cfg)
-        else:
-            self.config_data = default
-            with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-                json.dump(default, f, ensure_ascii=False, indent=2)
-
-    def _deep_merge(self, base, override):
-        merged = {}
-        for k, v in base.items():
-            if k in override and isinstance(v, dict):
-                merged[k] = self._deep_merge(v, override[k])
-            elif k in override:
-                merged[k] = override[k]
-            else:
-                merged[k] = v
-        for k in override:
-            if k not in merged:
-                merged[k] = override[k]
-        return merged
+        self.config_data = load_config(CONFIG_FILE)
 
     def _build_ui(self):
         nb = ttk.Notebook(self)
@@ -172,6 +188,10 @@ class ContactDialerApp(tk.Tk):
         self.password_var = tk.StringVar()
         ttk.Entry(tab1, textvariable=self.password_var, show="*", width=30).grid(row=2, column=1, **pad)
 
+        ttk.Label(tab1, text="ورودی خط:").grid(row=2, column=2, **pad, sticky="w")
+        self.input_cb = ttk.Combobox(tab1, state="readonly", width=30)
+        self.input_cb.grid(row=2, column=3, **pad)
+
         # selectors
         rows = [
             ("Selector نام کاربری:", "login_user_sel_var"),
@@ -199,9 +219,20 @@ class ContactDialerApp(tk.Tk):
         self.schedule_end_var = tk.StringVar()
         sf = ttk.Frame(tab1)
         sf.grid(row=11, column=1, sticky="w", **pad)
-        ttk.Entry(sf, textvariable=self.schedule_start_var, width=7).pack(side="left")
+        self.schedule_entries = (
+            ttk.Entry(sf, textvariable=self.schedule_start_var, width=7),
+            ttk.Entry(sf, textvariable=self.schedule_end_var, width=7),
+        )
+        self.schedule_entries[0].pack(side="left")
         ttk.Label(sf, text="تا").pack(side="left", padx=5)
-        ttk.Entry(sf, textvariable=self.schedule_end_var, width=7).pack(side="left")
+        self.schedule_entries[1].pack(side="left")
+        # config["schedule"]["windows"] replaces start/end; shown here, edited in config.json
+        self.schedule_windows_lbl = ttk.Label(sf, foreground="gray")
+        self.schedule_windows_lbl.pack(side="left", padx=8)
+
+        self.detect_answer_var = tk.BooleanVar()
+        ttk.Checkbutton(tab1, text="تشخیص پیام‌گیر/اعلان از ورودی خط",
+                        variable=self.detect_answer_var).grid(row=11, column=2, columnspan=2, sticky="w", **pad)
 
         bf = ttk.Frame(tab1)
         bf.grid(row=12, column=0, columnspan=4, pady=15)
@@ -216,6 +247,9 @@ class ContactDialerApp(tk.Tk):
         ttk.Button(ff, text="📄 بارگذاری Excel", command=self._load_excel).pack(side="left", padx=5)
         ttk.Button(ff, text="🗑️ پاک کردن لیست", command=self._clear_contacts).pack(side="left", padx=5)
         ttk.Button(ff, text="🔊 بارگذاری صدا", command=self._load_audio).pack(side="left", padx=5)
+        ttk.Button(ff, text="🚫 فهرست عدم تماس", command=self._load_dnc).pack(side="left", padx=5)
+        self.import_pb = ttk.Progressbar(ff, length=160, mode="determinate", maximum=1.0)
+        self.import_pb.pack(side="left", padx=5)
 
         # audio/play controls
         af = ttk.Frame(tab2)
@@ -244,24 +278,38 @@ class ContactDialerApp(tk.Tk):
         self.cat_cb.bind("<<ComboboxSelected>>", lambda e: self._filter_contacts())
 
         ttk.Label(tab2, text="لیست مخاطبین:").pack(anchor="w", padx=8, pady=4)
-        lf = ttk.Frame(tab2)
-        lf.pack(fill="both", expand=True, padx=10)
-        self.lb = tk.Listbox(lf, selectmode="extended")
-        self.lb.pack(side="left", fill="both", expand=True)
-        sb = ttk.Scrollbar(lf, command=self.lb.yview)
-        sb.pack(side="right", fill="y")
-        self.lb.config(yscrollcommand=sb.set)
+        self.lb = VirtualListbox(tab2, self._contact_row_text)
+        self.lb.pack(fill="both", expand=True, padx=10)
 
         act = ttk.Frame(tab2)
         act.pack(pady=12)
         ttk.Button(act, text="📞 تماس با انتخاب", command=lambda: self._start_calls(False)).pack(side="left", padx=8)
         ttk.Button(act, text="📞 تماس با همه", command=lambda: self._start_calls(True)).pack(side="left", padx=8)
         ttk.Button(act, text="📱 تماس دستی", command=self._open_manual_call_dialog).pack(side="left", padx=8)
+        ttk.Button(act, text="📊 گزارش", command=self._open_report).pack(side="left", padx=8)
 
         ttk.Label(tab2, text="لاگ تماس‌ها:").pack(anchor="w", padx=8, pady=4)
         self.log_txt = tk.Text(tab2, height=9, state="disabled")
         self.log_txt.pack(fill="x", padx=10, pady=5)
 
+        # Tab3: live throughput and stage latencies (metrics.METRICS)
+        tab3 = ttk.Frame(nb)
+        nb.add(tab3, text="📈 عملکرد")
+        self.rate_lbl = ttk.Label(tab3, font=("TkDefaultFont", 14))
+        self.rate_lbl.pack(anchor="w", padx=10, pady=(12, 4))
+        self.counts_lbl = ttk.Label(tab3)
+        self.counts_lbl.pack(anchor="w", padx=10, pady=2)
+        self.outcomes_lbl = ttk.Label(tab3)
+        self.outcomes_lbl.pack(anchor="w", padx=10, pady=2)
+        cols = ("n", "mean", "p50", "p95")
+        self.stage_tv = ttk.Treeview(tab3, columns=cols, height=10)
+        self.stage_tv.heading("#0", text="مرحله")
+        for col, title in zip(cols, ("تعداد", "میانگین ms", "p50 ms ≤", "p95 ms ≤")):
+            self.stage_tv.heading(col, text=title)
+            self.stage_tv.column(col, width=110, anchor="e")
+        self.stage_tv.pack(fill="x", padx=10, pady=8)
+        self.calls_history = collections.deque(maxlen=THROUGHPUT_WINDOW * 1000 // STATS_REFRESH_MS)
+
     def _save_config(self):
         c = self.config_data
         c["site_url"] = self.site_url_var.get().strip()
@@ -277,18 +325,28 @@ class ContactDialerApp(tk.Tk):
         sel["call_button"] = sanitize_selector(self.call_btn_sel_var.get().strip())
         sel["hangup_button"] = sanitize_selector(self.hangup_btn_sel_var.get().strip())
 
-        c["schedule"]["start"] = self.schedule_start_var.get().strip()
-        c["schedule"]["end"] = self.schedule_end_var.get().strip()
+        if not c["schedule"].get("windows"):
+            c["schedule"]["start"] = self.schedule_start_var.get().strip()
+            c["schedule"]["end"] = self.schedule_end_var.get().strip()
 
         out_name = self.output_cb.get()
         out_idx = next((i for i, n in self.output_devices if n == out_name), None)
-        c["audio"]["output_index"] = out_idx
+        if out_idx != c["audio"]["output_index"]:
+            c["audio"]["output_index"] = out_idx
+            with self.audio_lock:
+                init_mixer(c["audio"]["sample_rate"], out_idx)
+                self.audio_cache.clear()
+
+        in_name = self.input_cb.get()
+        c["audio"]["input_index"] = next((i for i, n in self.input_devices if n == in_name), None)
+        c["audio"]["detect_answer"] = self.detect_answer_var.get()
+        open_line_monitor(c["audio"], self._append_log)  # record before the first answer
 
         c["audio"]["repeat"] = self.repeat_var.get()
         c["audio"]["delay"] = self.delay_var.get()
 
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(c, f, ensure_ascii=False, indent=2)
+        save_config(c, CONFIG_FILE)
+        self.pool.configure(c)
         self._append_log("⚙️ تنظیمات ذخیره شد.")
 
     def _populate_settings(self):
@@ -308,33 +366,85 @@ class ContactDialerApp(tk.Tk):
 
         self.schedule_start_var.set(c["schedule"]["start"])
         self.schedule_end_var.set(c["schedule"]["end"])
+        windows = c["schedule"].get("windows")
+        for entry in self.schedule_entries:
+            entry.config(state="disabled" if windows else "normal")
+        self.schedule_windows_lbl.config(text=(
+            "بازه‌های config.json: " + "، ".join(f"{s}–{e}" for s, e in windows)
+        ) if windows else "")
 
         prev = c["audio"]
         if prev.get("output_index") is not None:
             name = next((n for i, n in self.output_devices if i == prev["output_index"]), None)
             if name:
                 self.output_cb.set(name)
+        self.detect_answer_var.set(bool(prev.get("detect_answer")))
+        if prev.get("input_index") is not None:
+            name = next((n for i, n in self.input_devices if i == prev["input_index"]), None)
+            if name:
+                self.input_cb.set(name)
 
     def _append_log(self, msg):
-        self.log_txt.config(state="normal")
-        ts = time.strftime("%H:%M:%S")
-        self.log_txt.insert(tk.END, f"[{ts}] {msg}\n")
-        self.log_txt.see(tk.END)
-        self.log_txt.config(state="disabled")
+        """Safe from any thread; the widget is updated by _drain_log."""
+        self.log_pipe.log(msg)
+
+    def _drain_log(self):
+        lines = self.log_pipe.drain()
+        if lines:
+            self.log_txt.config(state="normal")
+            self.log_txt.insert(tk.END, "\n".join(lines) + "\n")
+            excess = int(self.log_txt.index("end-1c").split(".")[0]) - 1 - LOG_UI_LINES
+            if excess > 0:
+                self.log_txt.delete("1.0", f"{excess + 1}.0")
+            self.log_txt.see(tk.END)
+            self.log_txt.config(state="disabled")
+        self.after(LOG_DRAIN_MS, self._drain_log)
+
+    def _start_metrics(self):
+        m = self.config_data["metrics"]
+        if not m["port"]:
+            return
+        try:
+            serve_metrics(m["host"], m["port"])
+            self._append_log(f"📈 متریک‌ها در http://{m['host']}:{m['port']}/metrics")
+        except OSError as e:
+            self._append_log(f"⚠️ سرور متریک راه‌اندازی نشد: {e}")
+
+    def _refresh_stats(self):
+        now = time.monotonic()
+        calls = METRICS.counter("dialer_calls_total")
+        self.calls_history.append((now, calls))
+        t0, c0 = self.calls_history[0]
+        rate = (calls - c0) / (now - t0) * 3600 if now > t0 else 0.0
+        self.rate_lbl.config(text=f"⚡ {rate:.0f} تماس در ساعت (۵ دقیقه اخیر)")
+        self.counts_lbl.config(text=(
+            f"کل تماس‌ها: {calls}   تماس مجدد: {METRICS.counter('dialer_redials_total')}   "
+            f"خطای دیال: {METRICS.counter('dialer_dial_errors_total')}   "
+            f"ورود مجدد: {METRICS.counter('dialer_relogins_total')}   "
+            f"عدم تماس: {METRICS.counter('dialer_dnc_skipped_total')}"
+        ))
+        outcomes = METRICS.counters("dialer_calls_total")
+        self.outcomes_lbl.config(text="   ".join(
+            f"{dict(k)['outcome']}: {v}" for k, v in sorted(outcomes.items())
+        ))
+        stages = METRICS.stages()
+        for stage, s in stages.items():
+            values = (s["n"], f"{s['mean'] * 1000:.0f}",
+                      f"{s['p50'] * 1000:.0f}", f"{s['p95'] * 1000:.0f}")
+            if self.stage_tv.exists(stage):
+                self.stage_tv.item(stage, values=values)
+            else:
+                self.stage_tv.insert("", tk.END, iid=stage, text=stage, values=values)
+        self.after(STATS_REFRESH_MS, self._refresh_stats)
 
     def _populate_audio_devices(self):
-        self.output_devices = []
-        for i in range(pygame.mixer.get_num_channels()):  # Simplified, since no pyaudio
-            self.output_devices.append((i, f"Device {i}"))
+        # output_index in the config is a position in SDL's device list
+        self.output_devices = list(enumerate(output_devices()))
 
         self.output_cb["values"] = [n for _, n in self.output_devices]
-
-    def _init_firefox_driver(self):
-        opts = Options()
-        opts.add_argument("--headless")
-        opts.set_preference("permissions.default.microphone", 1)
-        opts.set_preference("media.navigator.permission.disabled", True)
-        return webdriver.Firefox(options=opts)
+        self.input_devices = list(enumerate(input_devices()))
+        # the first entry clears the selection (no answer check)
+        self.input_cb["values"] = [""] + [n for _, n in self.input_devices]
 
     def _test_login(self):
         self._save_config()
@@ -348,93 +458,166 @@ class ContactDialerApp(tk.Tk):
             f"{cfg['selectors']['password']}, "
             f"{cfg['selectors']['login_button']}"
         )
-        try:
-            dr = self._init_firefox_driver()
-            dr.get(cfg["site_url"])
-            WebDriverWait(dr, 5).until(  # Reduced from 10s
-                EC.presence_of_element_located((By.CSS_SELECTOR, cfg["selectors"]["username"]))
-            )
-            dr.find_element(By.CSS_SELECTOR, cfg["selectors"]["username"]).send_keys(cfg["username"])
-            dr.find_element(By.CSS_SELECTOR, cfg["selectors"]["password"]).send_keys(cfg["password"])
-            dr.find_element(By.CSS_SELECTOR, cfg["selectors"]["login_button"]).click()
-            time.sleep(1)  # Reduced from 3s
-            self._append_log("✅ ورود با موفقیت انجام شد.")
-            dr.quit()
-        except Exception as e:
-            self._append_log(f"❌ خطا در تست ورود: {e}")
+        sessions = self.pool.acquire_all()
+        if not sessions:
+            self._append_log("⚠️ همه خطوط مشغول هستند.")
+        for session in sessions:
+            try:
+                if session.ensure_ready():
+                    session.log("✅ ورود با موفقیت انجام شد.")
+                else:
+                    session.log("✅ نشست فعال است؛ نیازی به ورود مجدد نیست.")
+            except Exception as e:
+                session.log(f"❌ خطا در تست ورود: {e}")
+            finally:
+                self.pool.release(session)
+
+    def _campaign_running(self):
+        """Warn and return True while a campaign owns the contact list and journal."""
+        if self.engine is None:
+            return False
+        messagebox.showwarning("هشدار", "یک کمپین در حال اجراست؛ تا پایان آن صبر کنید.")
+        return True
 
     def _load_excel(self):
-        path = filedialog.askopenfilename(filetypes=[("Excel", "*.xlsx *.xls")])
-        if not path:
+        if self._campaign_running():
             return
-        df = pd.read_excel(
-            path,
-            converters={"شماره موبایل": lambda x: str(x).strip().split('.')[0].zfill(11)}
-        )
-        need = {"نام", "دسته‌بندی", "شماره موبایل"}
-        if not need.issubset(df.columns):
-            messagebox.showerror("خطا", "ستون‌های لازم موجود نیست.")
+        path = filedialog.askopenfilename(filetypes=[
+            ("Contact lists", "*.xlsx *.xls *.csv *.parquet"),
+            ("Excel", "*.xlsx *.xls"),
+            ("CSV", "*.csv"),
+            ("Parquet", "*.parquet"),
+        ])
+        if not path:
             return
+        self.import_pb["value"] = 0
+        threading.Thread(target=self._import_contacts, args=(path,), daemon=True).start()
+
+    def _import_progress(self, rows, frac):
+        if frac is None:
+            self.import_pb.config(mode="indeterminate")
+            self.import_pb.step(0.05)
+        else:
+            self.import_pb.config(mode="determinate", value=frac)
 
-        if 'Called' not in df.columns:
-            df['Called'] = False
+    def _import_contacts(self, path):
+        """Worker thread: parse the list, then hand it to the Tk thread."""
+        self._append_log(f"📥 در حال خواندن {os.path.basename(path)}...")
+        try:
+            df, digest, cached = import_contacts(
+                path, progress=lambda rows, frac: self.after(0, self._import_progress, rows, frac)
+            )
+        except ValueError as e:
+            self.after(0, messagebox.showerror, "خطا", str(e))
+            return
+        except Exception as e:
+            self._append_log(f"❌ خطا در خواندن فایل: {e}")
+            return
+        self.after(0, self._on_contacts_imported, df, digest, cached)
 
-        self.contacts_df = df
-        self._persist_contacts()
-        cats = ["همه"] + sorted(df["دسته‌بندی"].dropna().unique())
+    def _on_contacts_imported(self, df, digest, cached):
+        if self._campaign_running():  # started while the file was being parsed
+            return
+        if self.ws.add_contacts(df, digest, cached)["unchanged"]:
+            return
+        cats = ["همه"] + self.store.categories()
         self.cat_cb["values"] = cats
         self.cat_cb.set("همه")
         self._filter_contacts()
-        self._append_log(f"📥 بارگذاری {len(df)} مخاطب.")
+
+    def _load_dnc(self):
+        path = filedialog.askopenfilename(filetypes=[
+            ("Number lists", "*.csv *.txt *.xlsx *.xls *.parquet"),
+        ])
+        if path:
+            threading.Thread(target=self._import_dnc, args=(path,), daemon=True).start()
+
+    def _import_dnc(self, path):
+        try:
+            added = self.dnc.add(read_numbers(path))
+        except Exception as e:
+            self._append_log(f"❌ خطا در خواندن فهرست عدم تماس: {e}")
+            return
+        self._append_log(f"🚫 {added} شماره به فهرست عدم تماس افزوده شد (مجموع {len(self.dnc)}).")
 
     def _load_persisted_contacts(self):
-        if os.path.exists(CONTACTS_FILE):
-            with open(CONTACTS_FILE, 'rb') as f:
-                self.contacts_df = pickle.load(f)
-            cats = ["همه"] + sorted(self.contacts_df["دسته‌بندی"].dropna().unique())
+        if self.ws.load_saved():
+            cats = ["همه"] + self.store.categories()
             self.cat_cb["values"] = cats
             self.cat_cb.set("همه")
             self._filter_contacts()
-            self._append_log(f"📥 لیست مخاطبین از حافظه بارگذاری شد ({len(self.contacts_df)} مخاطب).")
+            self.after(500, self._offer_resume)
 
-    def _persist_contacts(self):
-        with open(CONTACTS_FILE, 'wb') as f:
-            pickle.dump(self.contacts_df, f)
+    def _offer_resume(self):
+        pending = self.journal.pending_campaign()
+        if not pending:
+            return
+        if messagebox.askyesno(
+            "ادامه کمپین",
+            f"کمپین قبلی ناتمام ماند ({len(pending)} مخاطب باقی‌مانده). ادامه داده شود؟"
+        ):
+            self._launch_campaign(pending)
+        else:
+            self.journal.start_campaign([])
 
     def _clear_contacts(self):
+        if self._campaign_running():
+            return
         if messagebox.askyesno("تأیید", "آیا مطمئن هستید که لیست مخاطبین پاک شود؟"):
-            self.contacts_df = pd.DataFrame()
-            self.filtered_df = pd.DataFrame()
-            self.lb.delete(0, tk.END)
+            with self.contacts_lock:
+                self.store.load()
+            self.view_rows = self.store.rows()
+            self.lb.set_count(0)
             self.cat_cb["values"] = []
-            if os.path.exists(CONTACTS_FILE):
-                os.remove(CONTACTS_FILE)
+            self.journal.clear()
             self._append_log("🗑️ لیست مخاطبین پاک شد.")
 
+    def _preload_audio_files(self):
+        """Decode config["audio_files"] in the background; restore the last choice."""
+        files = [p for p in self.config_data["audio_files"] if os.path.exists(p)]
+        idx = self.config_data["audio_current_index"]
+        all_files = self.config_data["audio_files"]
+        if 0 <= idx < len(all_files) and all_files[idx] in files:
+            self.audio_path = all_files[idx]
+            self._append_log(f"🔊 صوت فعلی: {os.path.basename(self.audio_path)}")
+        self.audio_cache.preload(files, self._append_log)
+
     def _load_audio(self):
         p = filedialog.askopenfilename(filetypes=[("Audio", "*.mp3 *.wav")])
         if not p:
             return
         self.audio_path = p
+        files = self.config_data["audio_files"]
+        if p not in files:
+            files.append(p)
+        self.config_data["audio_current_index"] = files.index(p)
+        self.audio_cache.preload([p], self._append_log)
         self._append_log(f"🔊 صوت بارگذاری شد: {os.path.basename(p)}")
 
     def _filter_contacts(self):
-        if self.category_var.get() == "همه":
-            self.filtered_df = self.contacts_df.copy()
-        else:
-            self.filtered_df = self.contacts_df[
-                self.contacts_df["دسته‌بندی"] == self.category_var.get()
-            ]
-        self.lb.delete(0, tk.END)
-        for _, r in self.filtered_df.iterrows():
-            check = "☑️" if r['Called'] else "⬜"
-            self.lb.insert(tk.END, f"{check} {r['نام']} — {r['شماره موبایل']}")
+        cat = self.category_var.get()
+        self.view_rows = self.store.rows(None if cat == "همه" else cat)
+        self.lb.set_count(len(self.view_rows))
+
+    def _contact_row_text(self, i):
+        r = self.view_rows[i]
+        check = "☑️" if self.store.called[r] else "⬜"
+        return f"{check} {self.store.names[r]} — {self.store.phones[r]}"
+
+    def _refresh_rows(self, rows):
+        # view_rows is ascending, so a store row maps back by binary search
+        for r in rows:
+            i = int(np.searchsorted(self.view_rows, r))
+            if i < len(self.view_rows) and self.view_rows[i] == r:
+                self.lb.refresh_row(i)
 
     def _start_calls(self, all_contacts):
-        if self.filtered_df.empty:
+        if self._campaign_running():
+            return
+        if not len(self.view_rows):
             messagebox.showwarning("هشدار", "ابتدا اکسل بارگذاری شود.")
             return
-        idxs = range(len(self.filtered_df)) if all_contacts else self.lb.curselection()
+        idxs = range(len(self.view_rows)) if all_contacts else self.lb.curselection()
         if not idxs:
             messagebox.showwarning("هشدار", "حداقل یک مخاطب انتخاب کنید.")
             return
@@ -442,162 +625,44 @@ class ContactDialerApp(tk.Tk):
         self.config_data["audio"]["repeat"] = self.repeat_var.get()
         self.config_data["audio"]["delay"] = self.delay_var.get()
         self._save_config()
-        threading.Thread(target=self._do_calls, args=(idxs,), daemon=True).start()
-
-    def _is_present(self, sel) -> bool:
-        try:
-            return len(self.driver.find_elements(By.CSS_SELECTOR, sel)) > 0
-        except:
-            return False
+        contacts = [self.store.contact(self.view_rows[i]) for i in idxs]
+        self.journal.start_campaign(contacts)
+        self._launch_campaign(contacts)
+
+    def _launch_campaign(self, contacts):
+        # self.engine is set here on the Tk thread, so a second click sees it
+        self.engine = CampaignEngine(
+            self.pool, self.config_data, self._append_log, self._on_call_result, self.dnc
+        )
+        threading.Thread(target=self._do_calls, args=(self.engine, contacts), daemon=True).start()
 
-    def _wait_for_pause_outcome(self):
-        cfg = self.config_data["detect"]
-        sel = self.config_data["selectors"]["pause_indicator"]
-        ring_timeout = float(cfg["ring_timeout"])
-        off_busy_threshold = float(cfg["off_busy_threshold"])
-        answered_grace = float(cfg["answered_grace"])
-
-        deadline = time.monotonic() + ring_timeout
-        while time.monotonic() < deadline:
-            if self._is_present(sel):
-                t0 = time.monotonic()
-                self._append_log("⏳ نشانگر تماس ظاهر شد.")
-                break
-            time.sleep(0.2)
-        else:
-            self._append_log("🕔 تماس بی‌پاسخ/خارج‌دسترس.")
-            return {"status": "no_answer", "duration": 0.0}
-
-        while True:
-            elapsed = time.monotonic() - t0
-            present = self._is_present(sel)
-            if not present:
-                self._append_log(f"🧭 نشانگر ناپدید شد در {elapsed:.1f}s.")
-                if elapsed <= off_busy_threshold + 0.3:
-                    return {"status": "powered_off_or_busy", "duration": elapsed}
-                return {"status": "ended_after_answer", "duration": elapsed}
-            if elapsed >= off_busy_threshold + answered_grace:
-                self._append_log(f"✅ تماس برقرار شد ({elapsed:.1f}s).")
-                return {"status": "answered", "duration": elapsed}
-            time.sleep(0.2)
-
-    def _do_calls(self, idxs):
-        fmt = "%H:%M"
-        st = datetime.datetime.strptime(
-            self.config_data["schedule"]["start"], fmt
-        ).time()
-        ed = datetime.datetime.strptime(
-            self.config_data["schedule"]["end"], fmt
-        ).time()
-
-        while True:
-            now = datetime.datetime.now().time()
-            if st <= now <= ed:
-                break
-            self._append_log("⌛ خارج از بازه تماس، منتظر آغاز...")
-            time.sleep(30)
-
-        self._append_log("🚀 آغاز تماس‌ها...")
+    def _do_calls(self, engine, contacts):
         try:
-            self._login_driver()
-            for i in idxs:
-                row = self.filtered_df.iloc[i]
-                num = row["شماره موبایل"]
-                name = row["نام"]
-                self._append_log(f"📞 تماس: {name} ({num})")
-
-                # dial
-                success = False
-                while not success:
-                    try:
-                        inp = self.driver.find_element(
-                            By.CSS_SELECTOR, self.config_data["selectors"]["phone_input"]
-                        )
-                        inp.clear()
-                        inp.send_keys(num)
-                        time.sleep(0.5)
-                        self.driver.find_element(
-                            By.CSS_SELECTOR, self.config_data["selectors"]["call_button"]
-                        ).click()
-                        success = True
-                    except Exception as ex:
-                        self._append_log(f"⚠️ خطا در دیال: {ex}؛ تلاش مجدد...")
-                        time.sleep(3)  # Reduced from 5s
-                        self._login_driver()
-
-                outcome = self._wait_for_pause_outcome()
-                status, dur = outcome["status"], outcome["duration"]
-
-                # Mark as called
-                mask = self.contacts_df['شماره موبایل'] == num
-                self.contacts_df.loc[mask, 'Called'] = True
-                self._persist_contacts()
-                self._filter_contacts()
-
-                if status == "answered":
-                    if self.play_audio_call_var.get() and self.audio_path:
-                        if self.delay_var.get() > 0:
-                            time.sleep(self.delay_var.get())
-                        length = pygame.mixer.Sound(self.audio_path).get_length()
-                        for _ in range(self.repeat_var.get()):
-                            pygame.mixer.music.load(self.audio_path)
-                            pygame.mixer.music.play()
-                            time.sleep(length + 0.5)
-                        self._append_log(f"🎯 نتیجه تماس: وصل شد (~{dur:.1f}s).")
-                    else:
-                        self.call_active = True
-                        self.hangup_event.clear()
-                        self._append_log("☎️ تماس برقرار شد؛ منتظر قطع توسط کاربر...")
-                        self.hangup_event.wait()
-                        self._append_log("🔌 تماس قطع شد توسط کاربر.")
-                        self.call_active = False
-
-                elif status == "ended_after_answer":
-                    self._append_log(f"🟡 تماس وصل شد اما زود قطع شد (~{dur:.1f}s).")
-
-                elif status == "powered_off_or_busy":
-                    self._append_log(f"🔴 خاموش/مشغول (~{dur:.1f}s).")
-
-                else:
-                    self._append_log("⚫ بی‌پاسخ/خارج‌دسترس.")
-
-                time.sleep(0.5)  # Reduced from 2s
-
-            self._append_log("✅ تمام تماس‌ها انجام شد.")
+            self.ws.run_campaign(engine, contacts)
         except Exception as e:
             self._append_log(f"❌ خطا در تماس‌ها: {e}")
         finally:
-            if self.driver:
-                self.driver.quit()
-                self.driver = None
-
-    def _login_driver(self):
-        if self.driver:
-            try:
-                self.driver.quit()
-            except:
-                pass
-
-        self.driver = self._init_firefox_driver()
-        self.driver.get(self.config_data["site_url"])
-
-        sel = self.config_data["selectors"]
-        WebDriverWait(self.driver, 5).until(  # Reduced from 10s
-            EC.presence_of_element_located((By.CSS_SELECTOR, sel["username"]))
-        )
-        self.driver.find_element(By.CSS_SELECTOR, sel["username"]).send_keys(
-            self.config_data["username"]
-        )
-        self.driver.find_element(By.CSS_SELECTOR, sel["password"]).send_keys(
-            self.config_data["password"]
+            if self.engine is engine:
+                self.engine = None
+
+    def _on_call_result(self, session, contact, outcome):
+        """Runs on the dialing session's worker thread."""
+        # Mark as called; the outcome is only queued for the journal writer
+        rows = self.ws.record(contact, outcome)
+        self.after(0, self._refresh_rows, rows)
+
+        play = self._play_audio_message if self.play_audio_call_var.get() and self.audio_path else None
+        self.ws.finish_call(session, contact, outcome, play, hangup_by="توسط کاربر")
+
+    def _record_cdr(self, session, contact, outcome, audio_played):
+        self.cdr.add(call_record(session.name, contact, outcome, audio_played))
+
+    def _play_audio_message(self, session):
+        """True if the message played to the end, False if the call ended first."""
+        return play_into_call(
+            session, self.audio_cache.get(self.audio_path),
+            self.repeat_var.get(), self.delay_var.get(), self.audio_lock,
         )
-        self.driver.find_element(By.CSS_SELECTOR, sel["login_button"]).click()
-
-        WebDriverWait(self.driver, 5).until(  # Reduced from 10s
-            EC.element_to_be_clickable((By.CSS_SELECTOR, sel["dialer_button"]))
-        )
-        self.driver.find_element(By.CSS_SELECTOR, sel["dialer_button"]).click()
-        time.sleep(1)  # Reduced from 2s
 
     def _open_manual_call_dialog(self, preset_number: str = ""):
         dlg = tk.Toplevel(self)
@@ -625,39 +690,36 @@ class ContactDialerApp(tk.Tk):
             messagebox.showwarning("هشدار", "لطفاً شماره موبایل را وارد کنید.", parent=dialog)
             return
 
+        session = self.pool.acquire()
+        if session is None:
+            self._append_log("⚠️ همه خطوط مشغول هستند؛ تماس دستی ممکن نیست.")
+            dialog.destroy()
+            return
+
         self._append_log(f"📞 تماس دستی: {number}")
         try:
-            self._login_driver()
-            inp = self.driver.find_element(
-                By.CSS_SELECTOR, self.config_data["selectors"]["phone_input"]
-            )
-            inp.clear()
-            inp.send_keys(number)
-            time.sleep(0.5)
-            self.driver.find_element(
-                By.CSS_SELECTOR, self.config_data["selectors"]["call_button"]
-            ).click()
-
-            outcome = self._wait_for_pause_outcome()
+            session.ensure_ready()
+            session.dial(number)
+
+            outcome = session.wait_for_outcome()
             status, dur = outcome["status"], outcome["duration"]
 
+            played = False
             if status == "answered":
                 if self.play_audio_call_var.get() and self.audio_path:
-                    if self.delay_var.get() > 0:
-                        time.sleep(self.delay_var.get())
-                    length = pygame.mixer.Sound(self.audio_path).get_length()
-                    for _ in range(self.repeat_var.get()):
-                        pygame.mixer.music.load(self.audio_path)
-                        pygame.mixer.music.play()
-                        time.sleep(length + 0.5)
-                    self._append_log(f"🎯 تماس دستی وصل شد (~{dur:.1f}s).")
+                    played = self._play_audio_message(session)
+                    if played:
+                        self._append_log(f"🎯 تماس دستی وصل شد (~{dur:.1f}s).")
+                    else:
+                        self._append_log("🔇 تماس دستی پیش از پایان پیام قطع شد.")
                 else:
-                    self.call_active = True
-                    self.hangup_event.clear()
                     self._append_log("☎️ تماس دستی برقرار شد؛ منتظر قطع توسط کاربر...")
-                    self.hangup_event.wait()
+                    session.wait_for_hangup()
                     self._append_log("🔌 تماس دستی قطع شد توسط کاربر.")
-                    self.call_active = False
+
+            elif status in ("voicemail", "announcement"):
+                session.hangup()
+                self._append_log("📼 تماس دستی: پیام‌گیر/اعلان شبکه پاسخ داد؛ قطع شد.")
 
             elif status == "ended_after_answer":
                 self._append_log(f"🟡 تماس دستی قطع زودهنگام (~{dur:.1f}s).")
@@ -667,28 +729,79 @@ class ContactDialerApp(tk.Tk):
 
             else:
                 self._append_log("⚫ تماس دستی بی‌پاسخ/خارج‌دسترس.")
+
+            self._record_cdr(session, {"number": number}, outcome, played)
         except Exception as e:
             self._append_log(f"❌ خطا در تماس دستی: {e}")
         finally:
-            if self.driver:
-                self.driver.quit()
-                self.driver = None
+            self.pool.release(session)
             dialog.destroy()
 
+    def _open_report(self):
+        dlg = tk.Toplevel(self)
+        dlg.title("📊 گزارش تماس‌ها")
+        cols = ("category", "hour", "calls", "answered", "answer_rate")
+        heads = ("دسته‌بندی", "ساعت", "تماس", "پاسخ", "نرخ پاسخ")
+        tv = ttk.Treeview(dlg, columns=cols, show="headings", height=18)
+        for c, h in zip(cols, heads):
+            tv.heading(c, text=h)
+            tv.column(c, width=110, anchor="center")
+        tv.pack(fill="both", expand=True, padx=8, pady=8)
+
+        def show(df):
+            tv.delete(*tv.get_children())
+            for r in df.itertuples(index=False):
+                tv.insert("", tk.END, values=(
+                    r.category if isinstance(r.category, str) else "—",
+                    getattr(r, "hour", "همه"),
+                    r.calls, r.answered, f"{r.answer_rate:.1%}",
+                ))
+
+        def load(by):
+            def run():
+                try:
+                    self.cdr.flush()
+                    df = self.cdr.answer_rate(by=by)
+                except Exception as e:
+                    self._append_log(f"❌ خطا در گزارش: {e}")
+                    return
+                self.after(0, show, df)
+            threading.Thread(target=run, daemon=True).start()
+
+        def export():
+            path = filedialog.asksaveasfilename(parent=dlg, defaultextension=".csv",
+                                                filetypes=[("CSV", "*.csv")])
+            if not path:
+                return
+
+            def run():
+                try:
+                    self.cdr.flush()
+                    self.cdr.export_csv(path)
+                    self._append_log(f"📤 گزارش ذخیره شد: {os.path.basename(path)}")
+                except Exception as e:
+                    self._append_log(f"❌ خطا در ذخیره گزارش: {e}")
+            threading.Thread(target=run, daemon=True).start()
+
+        bf = ttk.Frame(dlg)
+        bf.pack(pady=(0, 8))
+        ttk.Button(bf, text="بر اساس دسته‌بندی", command=lambda: load(["category"])).pack(side="left", padx=4)
+        ttk.Button(bf, text="دسته‌بندی و ساعت", command=lambda: load(["category", "hour"])).pack(side="left", padx=4)
+        ttk.Button(bf, text="📤 خروجی CSV", command=export).pack(side="left", padx=4)
+        load(["category"])
+
     def _on_hangup(self):
         """User-triggered hang-up"""
-        if not self.call_active:
+        active = [s for s in self.pool.sessions if s.call_active]
+        if not active:
             self._append_log("⚠️ هیچ تماسی برای قطع وجود ندارد.")
             return
         self._append_log("🔌 درخواست قطع تماس ارسال شد.")
-        try:
-            sel = self.config_data["selectors"]["hangup_button"]
-            if sel and self.driver:
-                btn = self.driver.find_element(By.CSS_SELECTOR, sel)
-                btn.click()
-        except Exception as e:
-            self._append_log(f"⚠️ خطا در اجرای قطع تماس: {e}")
-        self.hangup_event.set()
+        for s in active:
+            try:
+                s.hangup()
+            except Exception as e:
+                s.log(f"⚠️ خطا در اجرای قطع تماس: {e}")
 
     def _hotkey_manual_call(self):
         """میانبر Ctrl+Shift+C: کپی شماره منتخب و بازکردن دیالوگ تماس دستی"""
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Browserless dialer backend ("api", see backends.py): talks to the telephony
+panel's HTTP API and follows call state over its WebSocket instead of
+watching the pause indicator in a Firefox page.
+
+All ApiSessions share one asyncio loop on a background thread and one
+aiohttp connection pool, so a line costs a WebSocket and a few KB instead of
+a browser; the blocking methods the campaign workers call just submit a
+coroutine to that loop and wait for it.
+
+    config["backend"] = "api"
+    config["api"] = {
+        "base_url": "",                 # empty = site_url
+        "login_path": "/api/login",     # POST {"username", "password"} -> {"token"}
+        "dial_path": "/api/dial",       # POST {"number"}
+        "hangup_path": "/api/hangup",   # POST {"number"}
+        "events_path": "/api/events",   # WebSocket, ?token=; {"event": "up"|"down"}
+        "timeout": 10
+    }
+
+Requests carry "Authorization: Bearer <token>".  "up"/"down" mark the call
+being connected and torn down, the moments the pause indicator appears and
+disappears on the page, so outcomes are classified with the same
+config["detect"] thresholds.  mockpanel.py implements this API, and
+`python selfcheck.py api` runs one call per outcome through it.
+"""
+
+import asyncio
+import atexit
+import threading
+import time
+from urllib.parse import urljoin
+
+from backends import DialerBackend
+from metrics import METRICS
+from tracing import span
+
+_loop = None
+_http = None
+_loop_lock = threading.Lock()
+
+
+def _event_loop():
+    """The shared loop, started on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="dialer-api", daemon=True).start()
+        return _loop
+
+
+async def _client():
+    global _http
+    if _http is None or _http.closed:
+        import aiohttp  # only needed by this backend
+        _http = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+        atexit.register(_close_client)
+    return _http
+
+
+def _close_client():
+    if _http is not None and not _http.closed:
+        try:
+            asyncio.run_coroutine_threadsafe(_http.close(), _loop).result(2)
+        except Exception:
+            pass
+
+
+class ApiError(Exception):
+    pass
+
+
+class ApiSession(DialerBackend):
+    def __init__(self, config, log, headless=True):
+        super().__init__(config, log, headless)
+        self.token = None
+        self._ws = None
+        self._reader = None
+        self._events = None  # asyncio.Queue of (event, loop time)
+        self._up = False
+        self._dial_t = None
+        self.number = None
+        self._idle = threading.Event()
+        self._idle.set()
+
+    # ---- plumbing ----
+    @property
+    def api(self):
+        return self.config.get("api") or {}
+
+    def _url(self, key):
+        base = self.api.get("base_url") or self.config["site_url"]
+        return urljoin(base, self.api[key])
+
+    def _run(self, coro):
+        fut = asyncio.run_coroutine_threadsafe(coro, _event_loop())
+        return fut.result()
+
+    async def _post(self, key, body, auth=True):
+        import aiohttp
+
+        http = await _client()
+        headers = {"Authorization": f"Bearer {self.token}"} if auth else {}
+        timeout = aiohttp.ClientTimeout(total=float(self.api.get("timeout", 10)))
+        async with http.post(self._url(key), json=body, headers=headers, timeout=timeout) as r:
+            if r.status >= 400:
+                raise ApiError(f"{self.api[key]}: HTTP {r.status}")
+            return await r.json(content_type=None)
+
+    async def _read_events(self, ws):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            event = msg.json().get("event")
+            if event == "up":
+                self._up = True
+                self._idle.clear()
+            elif event == "down":
+                self._up = False
+                self._idle.set()
+            self._events.put_nowait((event, loop.time()))
+        self._up = False
+        self._idle.set()
+
+    # ---- DialerBackend ----
+    def _login(self):
+        self.quit()
+        self._run(self._connect())
+
+    async def _connect(self):
+        res = await self._post("login_path", {
+            "username": self.config["username"], "password": self.config["password"],
+        }, auth=False)
+        self.token = res["token"]
+        http = await _client()
+        self._events = asyncio.Queue()
+        self._ws = await http.ws_connect(self._url("events_path"), params={"token": self.token},
+                                         heartbeat=30)
+        self._reader = asyncio.create_task(self._read_events(self._ws))
+
+    def is_ready(self) -> bool:
+        return self.token is not None and self._ws is not None and not self._ws.closed
+
+    def quit(self):
+        if self._ws is not None:
+            try:
+                self._run(self._ws.close())
+            except Exception:
+                pass
+        self.token = self._ws = self._reader = None
+        self._up = False
+        self._idle.set()
+
+    def dial(self, number):
+        with span("api.dial", number=number):
+            self._run(self._dial(number))
+        METRICS.observe("dial", time.time() - self.dialed_at)
+
+    async def _dial(self, number):
+        while not self._events.empty():  # leftovers of the previous call
+            self._events.get_nowait()
+        self.number = number
+        self.dialed_at = time.time()
+        self._dial_t = asyncio.get_running_loop().time()
+        await self._post("dial_path", {"number": number})
+
+    def _watch_outcome(self):
+        return self._run(self._watch())
+
+    async def _next_event(self, kind, deadline):
+        """Loop time of the next kind event before deadline, else None."""
+        loop = asyncio.get_running_loop()
+        while True:
+            left = deadline - loop.time()
+            if left <= 0:
+                return None
+            try:
+                event, t = await asyncio.wait_for(self._events.get(), left)
+            except asyncio.TimeoutError:
+                return None
+            if event == kind:
+                return t
+
+    async def _watch(self):
+        ring_timeout, off_busy_threshold, answered_grace = self._detect_params()
+        appeared = await self._next_event("up", self._dial_t + ring_timeout)
+        if appeared is None:
+            METRICS.observe("ring", ring_timeout)
+            self.log("🕔 تماس بی‌پاسخ/خارج‌دسترس.")
+            return {"status": "no_answer", "duration": 0.0}
+        METRICS.observe("ring", appeared - self._dial_t)
+        self.log(f"⏳ تماس برقرار شد ({appeared - self._dial_t:.2f}s پس از شماره‌گیری).")
+        gone = await self._next_event("down", appeared + off_busy_threshold + answered_grace)
+        ended = gone if gone is not None else asyncio.get_running_loop().time()
+        METRICS.observe("detect", ended - appeared)
+        return self._classify(ended - appeared, gone is not None)
+
+    def call_up(self) -> bool:
+        return self._up
+
+    def wait_idle(self, timeout=3.0):
+        with span("wait_idle", session=self.name):
+            self._idle.wait(timeout)
+
+    def hangup(self):
+        try:
+            if self.token:
+                self._run(self._post("hangup_path", {"number": self.number}))
+        finally:
+            self.hangup_event.set()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pre-decoded audio for answered calls.
+
+Each message file is decoded once into PCM in the mixer format (mono 16-bit at
+the telephony rate chosen in config["audio"]["sample_rate"]).  Decoded sounds
+are kept in an LRU bounded by a memory cap, and the raw PCM is also stored in
+audio_cache/ keyed by the file's content hash, so later runs skip decoding.
+
+The mixer is opened on the output device chosen in config["audio"]["output_index"]
+(an index into output_devices()).  play() returns at once; the Playback it
+hands back signals the real end of the audio and can be cancelled mid-way.
+
+With config["audio"]["detect_answer"] on and input_index set (an index into
+input_devices()), LineMonitor records that input – the line audio – into a ring buffer
+stamped with wall-clock time, so the audio right after an answer can be
+cut out and judged by vad.classify.  open_line_monitor() starts it as soon as
+detection is switched on, so the first answered call is already covered.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+from importer import file_digest
+from metrics import METRICS
+from tracing import span
+
+AUDIO_CACHE_DIR = "audio_cache"
+
+
+def output_devices():
+    """Names of the output devices SDL can open; needs an initialized mixer."""
+    try:
+        from pygame._sdl2 import audio as sdl_audio
+
+        return list(sdl_audio.get_audio_device_names(False))
+    except Exception:
+        return []
+
+
+def input_devices():
+    """Names of the capture devices SDL can open; needs an initialized mixer."""
+    try:
+        from pygame._sdl2 import audio as sdl_audio
+
+        return list(sdl_audio.get_audio_device_names(True))
+    except Exception:
+        return []
+
+
+def init_mixer(sample_rate=8000, output_index=None):
+    """Mono 16-bit mixer at the telephony rate on the chosen output device.
+
+    The cache stores this format.  Returns the device name, None for the
+    system default."""
+    if pygame.mixer.get_init():
+        pygame.mixer.quit()
+    pygame.mixer.init(frequency=sample_rate, size=-16, channels=1)
+    devices = output_devices()
+    if output_index is None or not 0 <= output_index < len(devices):
+        return None
+    pygame.mixer.quit()
+    pygame.mixer.init(frequency=sample_rate, size=-16, channels=1,
+                      devicename=devices[output_index])
+    return devices[output_index]
+
+
+class Playback:
+    """A sound being played: done is set when the audio has really ended."""
+
+    def __init__(self, channel, secs):
+        self.done = threading.Event()
+        self.cancelled = False
+        self._cancel = threading.Event()
+        threading.Thread(target=self._watch, args=(channel, secs), daemon=True).start()
+
+    def _watch(self, channel, secs):
+        # sleep through the known length, then follow the channel to the end
+        if not self._cancel.wait(secs):
+            while channel.get_busy() and not self._cancel.wait(0.01):
+                pass
+        if self._cancel.is_set():
+            channel.stop()
+            self.cancelled = True
+        self.done.set()
+
+    def cancel(self):
+        """Stop at once (the call was hung up or dropped)."""
+        self._cancel.set()
+
+    def wait(self, timeout=None) -> bool:
+        return self.done.wait(timeout)
+
+
+def play(sound, repeat=1):
+    """Start sound, repeated back to back, and return at once."""
+    channel = sound.play(loops=repeat - 1)
+    if channel is None:
+        raise RuntimeError("no free mixer channel")
+    return Playback(channel, sound.get_length() * repeat)
+
+
+def play_into_call(session, sound, repeat=1, delay=0, lock=None):
+    """Play sound on an answered call; returns True if it played to the end.
+
+    Stops at once when the user hangs up (session.hangup()) or the call
+    drops (pause indicator gone, checked every 250 ms).  lock serializes
+    lines sharing the one output device."""
+    session.call_active = True  # lets the hang-up button reach this call
+    session.hangup_event.clear()
+    try:
+        if delay > 0:
+            with span("audio_delay", secs=delay):
+                if session.hangup_event.wait(delay):
+                    return False
+        with lock or threading.Lock(), METRICS.time("playback"), span("playback", repeat=repeat):
+            pb = play(sound, repeat)
+            while not pb.wait(0.25):
+                if session.hangup_event.is_set() or not session.call_up():
+                    pb.cancel()
+                    pb.wait()
+        return not pb.cancelled
+    finally:
+        session.call_active = False
+
+
+class AudioCache:
+    def __init__(self, cache_dir=AUDIO_CACHE_DIR, max_bytes=64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sounds = OrderedDict()  # (path, mtime, size) -> (Sound, nbytes)
+        self._bytes = 0
+
+    def _pcm_path(self, digest):
+        freq, fmt, channels = pygame.mixer.get_init()
+        return os.path.join(self.cache_dir, f"{digest}_{freq}_{fmt}_{channels}.pcm")
+
+    def _decode(self, path):
+        pcm = self._pcm_path(file_digest(path))
+        if os.path.exists(pcm):
+            with open(pcm, "rb") as f:
+                raw = f.read()
+            return pygame.mixer.Sound(buffer=raw), len(raw)
+
+        sound = pygame.mixer.Sound(path)
+        raw = sound.get_raw()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(pcm + ".tmp", "wb") as f:
+            f.write(raw)
+        os.replace(pcm + ".tmp", pcm)
+        return sound, len(raw)
+
+    def get(self, path):
+        """Decoded Sound for path, ready to play."""
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            hit = self._sounds.get(key)
+            if hit:
+                self._sounds.move_to_end(key)
+                return hit[0]
+
+        sound, nbytes = self._decode(path)
+        with self._lock:
+            if key not in self._sounds:
+                self._sounds[key] = (sound, nbytes)
+                self._bytes += nbytes
+            # evict least recently used, but always keep the newest entry
+            while self._bytes > self.max_bytes and len(self._sounds) > 1:
+                _, (_, old) = self._sounds.popitem(last=False)
+                self._bytes -= old
+            return self._sounds[key][0]
+
+    def clear(self):
+        """Forget decoded sounds, e.g. after the mixer was re-opened."""
+        with self._lock:
+            self._sounds.clear()
+            self._bytes = 0
+
+    def preload(self, paths, log=None):
+        """Decode paths on a background thread."""
+        def run():
+            for p in paths:
+                try:
+                    self.get(p)
+                except Exception as e:
+                    if log:
+                        log(f"⚠️ خطا در آماده‌سازی صوت {os.path.basename(p)}: {e}")
+        threading.Thread(target=run, daemon=True).start()
+
+
+class LineBuffer:
+    """The last `seconds` of mono int16 audio at sample_rate, by wall-clock time."""
+
+    SLACK = 0.25  # capture callbacks arrive late by up to this much
+
+    def __init__(self, sample_rate=8000, seconds=30):
+        self.rate = sample_rate
+        self._buf = np.zeros(sample_rate * seconds, dtype=np.int16)
+        self._written = 0  # samples ever captured
+        self._t_end = None  # wall-clock time of the newest sample
+        self._cond = threading.Condition()
+
+    def feed(self, chunk, now):
+        """Append samples whose last one was captured at wall-clock time now."""
+        size = len(self._buf)
+        with self._cond:
+            start = self._written % size
+            first = min(len(chunk), size - start)
+            self._buf[start:start + first] = chunk[:first]
+            self._buf[:len(chunk) - first] = chunk[first:]
+            self._written += len(chunk)
+            self._t_end = now
+            self._cond.notify_all()
+
+    def since(self, t, secs, timeout=2.0):
+        """Samples from wall-clock time t on, waiting up to timeout for t + secs.
+
+        Raises ValueError when t is older than the buffer – capture started
+        after t or has already overwritten it – rather than judging a window
+        that misses its start."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._t_end is not None and self._t_end >= t + secs, timeout)
+            if self._t_end is None:
+                return np.empty(0, dtype=np.int16)
+            size = len(self._buf)
+            oldest = self._t_end - min(self._written, size) / self.rate
+            if t < oldest - self.SLACK:
+                raise ValueError(f"line audio only from {oldest - t:.1f}s after the answer")
+            start = self._written - int((self._t_end - t) * self.rate)
+            start = max(start, self._written - size, 0)
+            end = min(start + int(secs * self.rate), self._written)
+            return self._buf[np.arange(start, end) % size]
+
+
+class LineMonitor(LineBuffer):
+    """LineBuffer filled from an input device."""
+
+    def __init__(self, input_index, sample_rate=8000, seconds=30):
+        from pygame._sdl2 import audio as sdl_audio
+
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(frequency=sample_rate, size=-16, channels=1)
+        names = input_devices()
+        if not 0 <= input_index < len(names):
+            raise ValueError(f"no input device {input_index} (have {len(names)})")
+        super().__init__(sample_rate, seconds)
+        self.name = names[input_index]
+        self.device = sdl_audio.AudioDevice(
+            devicename=self.name, iscapture=True, frequency=sample_rate,
+            audioformat=sdl_audio.AUDIO_S16, numchannels=1, chunksize=256,
+            allowed_changes=0, callback=self._on_audio,
+        )
+        self.device.pause(0)
+
+    def _on_audio(self, device, mem):
+        self.feed(np.frombuffer(mem, dtype=np.int16), time.time())
+
+    def close(self):
+        self.device.close()
+
+
+_monitors = {}
+_monitors_lock = threading.Lock()
+
+
+def line_monitor(audio_cfg):
+    """Shared LineMonitor for audio_cfg["input_index"]; None when that is unset."""
+    index = audio_cfg.get("input_index")
+    if index is None:
+        return None
+    with _monitors_lock:
+        if index not in _monitors:
+            _monitors[index] = LineMonitor(index, audio_cfg["sample_rate"])
+        return _monitors[index]
+
+
+def open_line_monitor(audio_cfg, log):
+    """Start capturing the line now if answer detection is on; close other inputs.
+
+    Returns the monitor, or None when detection is off or the input could
+    not be opened (logged)."""
+    wanted = audio_cfg.get("input_index") if audio_cfg.get("detect_answer") else None
+    with _monitors_lock:
+        for index in [i for i in _monitors if i != wanted]:
+            _monitors.pop(index).close()
+    if wanted is None:
+        if audio_cfg.get("detect_answer"):
+            log("⚠️ تشخیص پاسخ روشن است اما ورودی خط انتخاب نشده.")
+        return None
+    try:
+        return line_monitor(audio_cfg)
+    except Exception as e:
+        log(f"⚠️ ورودی خط باز نشد: {e}")
+        return None
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Dialer backends – what SessionPool and CampaignEngine need from one line.
+
+A backend logs in with one agent account, dials, reports when the call is
+"up" (the panel's pause indicator) and hangs up.  Outcome classification
+from those up/down timings is shared here, so every backend decides calls
+the same way.  config["backend"] picks the implementation per session:
+
+    "selenium"  sessions.DialerSession – drives the panel page in Firefox
+                (sharedbrowser.SharedTabSession with config["browser"]["shared"])
+    "api"       apiclient.ApiSession   – talks to the panel's HTTP/WebSocket
+                API from one shared asyncio loop, no browser
+"""
+
+import threading
+import time
+
+from metrics import METRICS
+from tracing import span
+
+
+class DialerBackend:
+    """Base class; subclasses implement the methods raising NotImplementedError."""
+
+    def __init__(self, config, log, headless=True):
+        self.config = config
+        self.name = config.get("name", "")
+        self.label = ""  # log prefix, set when several sessions run together
+        self.headless = headless
+        self._log_fn = log
+        self.dialed_at = None
+        self._logins = 0
+
+        # call control
+        self.hangup_event = threading.Event()
+        self.call_active = False
+
+    def log(self, msg):
+        self._log_fn(f"[{self.label}] {msg}" if self.label else msg)
+
+    # ---- to implement ----
+    def _login(self):
+        raise NotImplementedError
+
+    def is_ready(self) -> bool:
+        """Health check: logged in and able to dial right now."""
+        raise NotImplementedError
+
+    def dial(self, number):
+        """Start a call; sets dialed_at."""
+        raise NotImplementedError
+
+    def _watch_outcome(self):
+        """{"status", "duration"} of the call just dialed."""
+        raise NotImplementedError
+
+    def call_up(self) -> bool:
+        """True while the call is connected."""
+        raise NotImplementedError
+
+    def wait_idle(self, timeout=3.0):
+        """Wait until the last call has been torn down."""
+        raise NotImplementedError
+
+    def hangup(self):
+        """End the current call; must set hangup_event even if that fails."""
+        raise NotImplementedError
+
+    def quit(self):
+        raise NotImplementedError
+
+    # ---- shared ----
+    def login(self):
+        with METRICS.time("login"), span("login", session=self.name):
+            self._login()
+        if self._logins:
+            METRICS.inc("dialer_relogins_total")
+        self._logins += 1
+
+    def ensure_ready(self) -> bool:
+        """Log in only if the session is dead; returns True when it had to."""
+        with span("is_ready", session=self.name):
+            ready = self.is_ready()
+        if ready:
+            return False
+        self.log("🔑 ورود به پنل...")
+        self.login()
+        return True
+
+    def _detect_params(self):
+        cfg = self.config["detect"]
+        return (
+            float(cfg["ring_timeout"]),
+            float(cfg["off_busy_threshold"]),
+            float(cfg["answered_grace"]),
+        )
+
+    def _classify(self, elapsed, gone):
+        _, off_busy_threshold, _ = self._detect_params()
+        if gone:
+            self.log(f"🧭 نشانگر ناپدید شد در {elapsed:.2f}s.")
+            if elapsed <= off_busy_threshold + 0.3:
+                return {"status": "powered_off_or_busy", "duration": elapsed}
+            return {"status": "ended_after_answer", "duration": elapsed}
+        self.log(f"✅ تماس برقرار شد ({elapsed:.2f}s).")
+        return {"status": "answered", "duration": elapsed}
+
+    def wait_for_outcome(self):
+        """Outcome of the last dial: status, duration plus dialed_at/decided_at."""
+        with span("wait_for_outcome", session=self.name):
+            out = self._watch_outcome()
+        out["dialed_at"] = self.dialed_at
+        out["decided_at"] = time.time()
+        audio_cfg = self.config.get("audio") or {}
+        if out["status"] == "answered" and audio_cfg.get("detect_answer"):
+            self._check_answer(out)
+        return out
+
+    def _check_answer(self, out):
+        """Turn an answer into "voicemail"/"announcement" when the line audio says so."""
+        from audio import line_monitor  # pygame only when line analysis is on
+        from vad import classify
+
+        cfg = self.config["audio"]
+        try:
+            with METRICS.time("answer_check"), span("answer_check", session=self.name):
+                monitor = line_monitor(cfg)
+                if monitor is None:
+                    raise ValueError("audio.input_index is not set")
+                answered_at = out["decided_at"] - out["duration"]
+                window = float(cfg.get("answer_window", 3.0))
+                res = classify(monitor.since(answered_at, window), monitor.rate, window,
+                               float(cfg.get("voicemail_s", 2.5)))
+        except Exception as e:
+            self.log(f"⚠️ تحلیل صدای خط ممکن نشد: {e}")
+            return
+        out["answer"] = res["verdict"]
+        METRICS.inc("dialer_answer_verdicts_total", verdict=res["verdict"])
+        if res["verdict"] in ("voicemail", "announcement"):
+            out["status"] = res["verdict"]
+            self.log(f"📼 پاسخ خودکار تشخیص داده شد ({res['verdict']}، "
+                     f"گفتار {res['longest_voice_s']:.1f}s، بوق {res['tone_s']:.1f}s).")
+
+    def wait_for_hangup(self):
+        """Keep the call open until the user presses hang-up."""
+        self.call_active = True
+        self.hangup_event.clear()
+        with span("wait_for_hangup", session=self.name):
+            self.hangup_event.wait()
+        self.call_active = False
+
+
+def make_session(config, log, headless=True):
+    """Backend for one expanded session config (see sessions.session_configs)."""
+    kind = config.get("backend") or "selenium"
+    if kind == "selenium":
+        if (config.get("browser") or {}).get("shared"):
+            from sharedbrowser import SharedTabSession
+            return SharedTabSession(config, log, headless)
+        from sessions import DialerSession
+        return DialerSession(config, log, headless)
+    if kind == "api":
+        from apiclient import ApiSession
+        return ApiSession(config, log, headless)
+    raise ValueError(f"unknown dialer backend: {kind}")
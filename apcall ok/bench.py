@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+End-to-end dialer benchmark against the local mock panel (mockpanel.py).
+
+Runs a real campaign – Firefox sessions, CampaignEngine, contact store,
+journal and CDR store in a scratch directory – over synthetic numbers and
+reports calls per hour, outcome detection accuracy/latency against the
+panel's ground truth, and per-stage timings of the dialing loop (login,
+dial, outcome detection, result handling, whole cycle).
+
+    python bench.py --calls 60 --lines 2 --json run.json
+    python bench.py --calls 60 --baseline run.json   # exit 1 on a regression
+    python bench.py --calls 20 --trace run.trace.json  # spans for a trace viewer
+    python bench.py --calls 200 --lines 24 --backend api  # browserless (apiclient.py)
+    python bench.py --calls 60 --lines 6 --shared-browser # all lines as tabs of one Firefox
+
+Answered calls are hung up right away; no audio is played.  On Linux the
+report includes the memory (PSS) of the browser processes at the end of the
+run, in total and per line.
+"""
+
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from sessions import SessionPool
+from settings import DEFAULT_CONFIG
+from campaign import CampaignEngine
+from journal import ContactJournal
+from contacts import ContactStore, NAME_COL, CAT_COL, PHONE_COL
+from cdr import CdrStore, call_record
+from mockpanel import MockPanel, serve_mock
+from tracing import TRACER
+
+
+class StageTimer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, stage, secs):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(secs)
+
+    def wrap(self, obj, name, stage=None):
+        """Time every call of obj.name (an instance attribute shadows the method)."""
+        fn = getattr(obj, name)
+
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage or name, time.perf_counter() - t0)
+        setattr(obj, name, timed)
+
+    def summary(self):
+        out = {}
+        for stage, xs in sorted(self.samples.items()):
+            xs = sorted(xs)
+            out[stage] = {
+                "n": len(xs),
+                "mean_ms": statistics.fmean(xs) * 1000,
+                "p50_ms": xs[len(xs) // 2] * 1000,
+                "p95_ms": xs[min(len(xs) - 1, int(len(xs) * 0.95))] * 1000,
+            }
+        return out
+
+
+def browser_memory_mb():
+    """PSS of every descendant process (browsers, drivers) in MB; None off Linux."""
+    if not os.path.isdir("/proc"):
+        return None
+    children = {}
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(pid))
+    total_kb, todo = 0, list(children.get(os.getpid(), []))
+    while todo:
+        pid = todo.pop()
+        todo.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                total_kb += next(int(line.split()[1]) for line in f if line.startswith("Pss:"))
+        except (OSError, StopIteration):
+            pass
+    return total_kb / 1024
+
+
+def bench_config(url, lines, overrides=None):
+    cfg = copy.deepcopy(DEFAULT_CONFIG)
+    cfg["site_url"] = url
+    cfg["username"], cfg["password"] = "agent0", "secret"
+    cfg["selectors"]["hangup_button"] = "button.hangup"
+    cfg["schedule"]["windows"] = [["00:00", "23:59"]]
+    cfg["redial"]["max_attempts"] = 1  # one dial per number keeps truth matching simple
+    if lines > 1:
+        cfg["sessions"] = [{"name": f"line{i + 1}", "username": f"agent{i}"} for i in range(lines)]
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict):
+            cfg[key].update(value)
+        else:
+            cfg[key] = value
+    return cfg
+
+
+def expected_decision(call, detect):
+    """Seconds after the dial at which a perfect detector could decide."""
+    if call["ring_s"] is None:
+        return float(detect["ring_timeout"])
+    settle = float(detect["off_busy_threshold"]) + float(detect["answered_grace"])
+    if call["outcome"] == "answered":
+        return call["ring_s"] + settle
+    return call["ring_s"] + min(call["hold_s"], settle)
+
+
+def run_bench(calls, lines, profile=None, port=8790, visible=False, overrides=None, log=print):
+    panel = MockPanel(profile)
+    server = serve_mock(panel, port=port)
+    cfg = bench_config(f"http://127.0.0.1:{port}/", lines, overrides)
+    timer = StageTimer()
+    results = []
+    res_lock = threading.Lock()
+    workdir = tempfile.mkdtemp(prefix="dialer-bench-")
+
+    store = ContactStore(pd.DataFrame({
+        NAME_COL: [f"bench{i}" for i in range(calls)],
+        CAT_COL: "bench",
+        PHONE_COL: [f"0990{i:07d}" for i in range(calls)],
+        "Called": False,
+    }))
+    contacts_lock = threading.Lock()
+
+    def snapshot():
+        with contacts_lock:
+            return store.to_frame()
+
+    journal = ContactJournal(os.path.join(workdir, "contacts.pkl"),
+                             os.path.join(workdir, "journal.db"), snapshot=snapshot)
+    journal.reset(store.to_frame())
+    cdr = CdrStore(os.path.join(workdir, "cdr"))
+    last_dial = {}
+
+    def on_result(session, contact, outcome):
+        # what ContactDialerApp._on_call_result does, minus audio and the UI
+        t0 = time.perf_counter()
+        ts = time.time()
+        with contacts_lock:
+            store.mark(contact["number"], outcome["status"], ts)
+            journal.record(contact["number"], outcome["status"], outcome["duration"], ts)
+        if outcome["status"] == "answered":
+            session.hangup()
+        cdr.add(call_record(session.name, contact, outcome, False))
+        timer.add("result", time.perf_counter() - t0)
+        with res_lock:
+            results.append(dict(outcome, number=contact["number"]))
+
+    pool = SessionPool(cfg, log, headless=not visible)
+    for s in pool.sessions:
+        timer.wrap(s, "login")
+        timer.wrap(s, "ensure_ready")
+        timer.wrap(s, "wait_for_outcome", "detect")
+        dial = s.dial
+
+        def timed_dial(number, _s=s, _dial=dial):
+            now = time.perf_counter()
+            prev = last_dial.get(_s.name)
+            if prev is not None:
+                timer.add("cycle", now - prev)  # dial to dial on one line
+            last_dial[_s.name] = now
+            try:
+                return _dial(number)
+            finally:
+                timer.add("dial", time.perf_counter() - now)
+        s.dial = timed_dial
+
+    engine = CampaignEngine(pool, cfg, log, on_result)
+    t0 = time.time()
+    memory = None
+    try:
+        engine.run([store.contact(r) for r in store.rows()])
+    finally:
+        wall = time.time() - t0
+        memory = browser_memory_mb()  # before the browsers are closed
+        pool.close()
+        journal.flush()
+        cdr.close()
+        server.shutdown()
+
+    truth = {c["number"]: c for c in panel.truth()}
+    latencies, correct = [], 0
+    for res in results:
+        call = truth.get(res["number"])
+        if call is None:
+            continue
+        correct += res["status"] == call["outcome"]
+        latencies.append(res["decided_at"] - call["dialed_at"] - expected_decision(call, cfg["detect"]))
+    latencies.sort()
+
+    return {
+        "calls": len(results),
+        "lines": lines,
+        "wall_s": wall,
+        "calls_per_hour": len(results) / wall * 3600 if wall else 0.0,
+        "accuracy": correct / len(results) if results else 0.0,
+        "detect_latency_ms": {
+            "mean": statistics.fmean(latencies) * 1000 if latencies else None,
+            "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+            if latencies else None,
+        },
+        "stages": timer.summary(),
+        "browser_mb": memory,
+        "browser_mb_per_line": memory / lines if memory is not None else None,
+        "workdir": workdir,
+    }
+
+
+def print_report(rep):
+    print(f"calls: {rep['calls']} on {rep['lines']} line(s) in {rep['wall_s']:.1f}s "
+          f"-> {rep['calls_per_hour']:.0f} calls/hour")
+    print(f"outcome accuracy: {rep['accuracy']:.1%}")
+    if rep.get("browser_mb") is not None:
+        print(f"browser memory: {rep['browser_mb']:.0f} MB, "
+              f"{rep['browser_mb_per_line']:.0f} MB per line")
+    lat = rep["detect_latency_ms"]
+    if lat["mean"] is not None:
+        print(f"detection latency: mean {lat['mean']:.0f} ms, p95 {lat['p95']:.0f} ms")
+    print(f"{'stage':<14}{'n':>6}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, s in rep["stages"].items():
+        print(f"{stage:<14}{s['n']:>6}{s['mean_ms']:>10.1f}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}")
+
+
+def regressions(rep, base, tolerance):
+    """Human-readable list of metrics worse than the baseline by more than tolerance."""
+    found = []
+    if rep["calls_per_hour"] < base["calls_per_hour"] * (1 - tolerance):
+        found.append(f"calls/hour {rep['calls_per_hour']:.0f} < {base['calls_per_hour']:.0f}")
+    if rep.get("browser_mb_per_line") and base.get("browser_mb_per_line") and \
+            rep["browser_mb_per_line"] > base["browser_mb_per_line"] * (1 + tolerance):
+        found.append(f"memory {rep['browser_mb_per_line']:.0f} MB/line "
+                     f"> {base['browser_mb_per_line']:.0f} MB/line")
+    if rep["accuracy"] < base["accuracy"] - tolerance:
+        found.append(f"accuracy {rep['accuracy']:.1%} < {base['accuracy']:.1%}")
+    for stage, s in rep["stages"].items():
+        b = base["stages"].get(stage)
+        if b and s["p50_ms"] > b["p50_ms"] * (1 + tolerance) + 5:
+            found.append(f"{stage} p50 {s['p50_ms']:.0f} ms > {b['p50_ms']:.0f} ms")
+    return found
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Dialer throughput benchmark on the mock panel")
+    ap.add_argument("--calls", type=int, default=40)
+    ap.add_argument("--lines", type=int, default=1)
+    ap.add_argument("--port", type=int, default=8790)
+    ap.add_argument("--profile", help="mock panel profile JSON (see mockpanel.py)")
+    ap.add_argument("--config", help="JSON merged over the bench config, e.g. a detect section")
+    ap.add_argument("--visible", action="store_true", help="show the Firefox windows")
+    ap.add_argument("--backend", choices=("selenium", "api"), default="selenium")
+    ap.add_argument("--shared-browser", action="store_true",
+                    help="every line as a tab of one Firefox (sharedbrowser.py)")
+    ap.add_argument("--lite", action="store_true", help="no images/fonts in per-line browsers")
+    ap.add_argument("--json", help="write the report here")
+    ap.add_argument("--baseline", help="earlier --json report to compare with")
+    ap.add_argument("--tolerance", type=float, default=0.1)
+    ap.add_argument("--trace", help="write a Chrome trace of the run here")
+    ap.add_argument("--browser-profile", help="persistent Firefox profile dir; run twice "
+                    "to compare a cold login with a remembered session")
+    args = ap.parse_args()
+
+    def load(path):
+        if not path:
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    overrides = load(args.config) or {}
+    overrides["backend"] = args.backend
+    browser = overrides.setdefault("browser", {})
+    if args.browser_profile:
+        browser["profile_dir"] = args.browser_profile
+    if args.shared_browser:
+        browser["shared"] = True
+    if args.lite:
+        browser["lite"] = True
+    if args.trace:
+        TRACER.start(args.trace)
+    try:
+        rep = run_bench(args.calls, args.lines, load(args.profile), args.port,
+                        args.visible, overrides, log=lambda m: None)
+    finally:
+        TRACER.stop()
+    print_report(rep)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+    base = load(args.baseline)
+    if base:
+        found = regressions(rep, base, args.tolerance)
+        for line in found:
+            print(f"REGRESSION: {line}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
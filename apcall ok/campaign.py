@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Campaign engine – runs one dialing worker per idle pooled session, all pulling
+contacts from a shared work queue.  Outcome handling (status update, audio,
+waiting for hang-up) is delegated to the on_result callback, which runs on the
+worker thread of the session that made the call.
+
+Busy/unanswered contacts are put back on a timed redial heap with per-outcome
+backoff (config["redial"]) until they run out of attempts; redials that have
+come due are dialed ahead of the remaining fresh contacts.
+
+The calling window (timewindows.CallSchedule) is checked before every dial; a
+contact whose window is closed is parked on the same heap until it reopens,
+so a campaign pauses at the window end and resumes where it stopped.
+Numbers on the do-not-call index (dnc.DncIndex) are skipped right before
+dialing, so opt-outs added mid-campaign are honoured.
+
+The loop is pipelined: as soon as a number is dialed the worker already
+takes, checks and stages its next contact (unless another line is idle and
+needs it more), and after the call it only waits for the page to tear the
+call down before dialing the staged one.  The staged contact is checked
+against the window and the do-not-call index again right before it is
+dialed, and an answered call hands it back to the queue before on_result
+(audio, waiting for hang-up) so idle lines can take it.
+"""
+
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+from metrics import METRICS
+from tracing import instant, span
+from timewindows import CallSchedule
+
+
+class DialQueue:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._fresh = collections.deque()
+        # (due wall-clock time, seq, contact); wall clock so contacts parked
+        # until the same window start keep their original order
+        self._redial = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._waiting = 0  # workers blocked in get()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._fresh) + len(self._redial)
+
+    def put(self, contact, front=False):
+        with self._cond:
+            if front:
+                self._fresh.appendleft(contact)
+            else:
+                self._fresh.append(contact)
+            self._cond.notify()
+
+    def schedule(self, contact, delay):
+        self.schedule_at(contact, time.time() + delay)
+
+    def schedule_at(self, contact, when):
+        with self._cond:
+            heapq.heappush(self._redial, (when, next(self._seq), contact))
+            self._cond.notify()
+
+    def get(self, stop_event, block=True):
+        """Next contact to dial, waiting for redials to come due; None when done.
+
+        With block=False (staging) it returns None at once if nothing is due
+        or another worker is already waiting for work."""
+        with self._cond:
+            while not stop_event.is_set():
+                now = time.time()
+                if not block and self._waiting:
+                    return None
+                if self._redial and self._redial[0][0] <= now:
+                    contact = heapq.heappop(self._redial)[2]
+                elif self._fresh:
+                    contact = self._fresh.popleft()
+                elif block and (self._redial or self._in_flight):
+                    # an in-flight call may still schedule a redial
+                    wait = self._redial[0][0] - now if self._redial else 1.0
+                    self._waiting += 1
+                    self._cond.wait(min(wait, 1.0))
+                    self._waiting -= 1
+                    continue
+                else:
+                    return None
+                self._in_flight += 1
+                return contact
+            return None
+
+    def task_done(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+
+class CampaignEngine:
+    def __init__(self, pool, config, log, on_result, dnc=None):
+        self.pool = pool
+        self.config = config
+        self.log = log
+        self.on_result = on_result
+        self.dnc = dnc
+        self.stop_event = threading.Event()
+        self._running = threading.Event()  # cleared while paused
+        self._running.set()
+        self.work = DialQueue()
+        self.sessions = []
+        self.schedule = CallSchedule(config["schedule"])
+        self._paused_until = None
+        self._pause_lock = threading.Lock()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def pause(self):
+        """Finish the calls in progress, then hold until resume()."""
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def _wait_for_window(self):
+        """Sleep until the first calling window (of any category) opens."""
+        wait = self.schedule.seconds_until_any_open()
+        if wait > 0:
+            at = time.strftime("%H:%M", time.localtime(time.time() + wait))
+            self.log(f"⌛ خارج از بازه تماس، منتظر آغاز در {at}...")
+            with span("window_wait", secs=wait):
+                self.stop_event.wait(wait)
+
+    def _park(self, contact):
+        """Hold a contact until its calling window reopens."""
+        at = self.schedule.next_open(contact.get("category"))
+        if at is None:
+            self.log(f"🚫 دسته «{contact.get('category')}» بازه تماس ندارد؛ "
+                     f"{contact['number']} رد شد.")
+            return
+        self.work.schedule_at(contact, at.timestamp())
+        until = at.strftime("%m-%d %H:%M")
+        with self._pause_lock:
+            announce = until != self._paused_until
+            self._paused_until = until
+        if announce:
+            self.log(f"⏸️ پایان بازه تماس؛ ادامه در {until}")
+
+    def run(self, contacts):
+        """Dial every contact ({"name", "number", ...}) and block until done.
+
+        A contact with "due" (a resumed redial) waits until that wall-clock time."""
+        now = time.time()
+        for c in contacts:
+            if c.get("due", 0) > now:
+                self.work.schedule_at(c, c["due"])
+            else:
+                self.work.put(c)
+        if self.dnc is not None:
+            self.dnc.reload()
+
+        self._wait_for_window()
+        if self.stop_event.is_set():
+            return
+
+        self.sessions = self.pool.acquire_all()
+        if not self.sessions:
+            self.log("⚠️ همه خطوط مشغول هستند.")
+            return
+
+        if self.config["audio"].get("detect_answer"):
+            from audio import open_line_monitor  # pygame only when line analysis is on
+            open_line_monitor(self.config["audio"], self.log)  # before the first answer
+
+        self.log(f"🚀 آغاز تماس‌ها با {len(self.sessions)} خط...")
+        workers = [
+            threading.Thread(target=self._worker, args=(s,), daemon=True)
+            for s in self.sessions
+        ]
+        try:
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+        finally:
+            for s in self.sessions:
+                self.pool.release(s)
+
+        left = len(self.work)
+        if left:
+            self.log(f"⚠️ {left} مخاطب بدون تماس باقی ماند.")
+        else:
+            self.log("✅ تمام تماس‌ها انجام شد.")
+
+    def _worker(self, session):
+        try:
+            session.ensure_ready()
+        except Exception as e:
+            session.log(f"❌ خطا در ورود: {e}")
+            session.quit()
+            return
+
+        slot = {}  # "next": contact staged while the current call runs
+        try:
+            while True:
+                if not self._running.is_set():
+                    with span("paused", session=session.name):
+                        while not self._running.wait(0.5) and not self.stop_event.is_set():
+                            pass
+                if self.stop_event.is_set():
+                    break
+                contact = slot.pop("next", None)
+                if contact is not None and not self._admit(session, contact):
+                    contact = None  # staged while ringing; no longer allowed
+                contact = contact or self._next(session)
+                if contact is None:
+                    break
+                try:
+                    self._call(session, contact, slot)
+                except Exception as e:
+                    # hand the contact back so a healthy session can take it
+                    self.work.put(contact, front=True)
+                    session.log(f"❌ خطا در تماس‌ها: {e}")
+                    session.quit()
+                    break
+                finally:
+                    self.work.task_done()
+        finally:
+            self._unstage(slot)
+
+    def _unstage(self, slot):
+        """Hand a staged contact back to the front of the queue."""
+        staged = slot.pop("next", None)
+        if staged is not None:
+            self.work.put(staged, front=True)
+            self.work.task_done()
+
+    def _admit(self, session, contact) -> bool:
+        """True if contact may be dialed now; else parks or skips it (task done)."""
+        if not self.schedule.is_open(contact.get("category")):
+            self._park(contact)
+        elif self.dnc is not None and self.dnc.contains(contact["number"]):
+            METRICS.inc("dialer_dnc_skipped_total")
+            session.log(f"🚫 {contact['number']} در فهرست عدم تماس است؛ رد شد.")
+        else:
+            return True
+        self.work.task_done()
+        return False
+
+    def _next(self, session, block=True):
+        """Next contact that may be dialed now; parks or skips the others."""
+        while True:
+            with span("queue_get", block=block):
+                contact = self.work.get(self.stop_event, block)
+            if contact is None:
+                return None
+            if self._admit(session, contact):
+                return contact
+
+    def _call(self, session, contact, slot):
+        with span("call", session=session.name, number=contact["number"]):
+            self._dial_and_handle(session, contact, slot)
+
+    def _dial_and_handle(self, session, contact, slot):
+        num = contact["number"]
+        session.log(f"📞 تماس: {contact['name']} ({num})")
+
+        for attempt in itertools.count():
+            if self.stop_event.is_set():
+                self.work.put(contact, front=True)  # never dialed; left for a resume
+                return
+            try:
+                session.dial(num)
+                break
+            except Exception as ex:
+                METRICS.inc("dialer_dial_errors_total")
+                session.log(f"⚠️ خطا در دیال: {ex}؛ تلاش مجدد...")
+                with span("sleep", secs=3):
+                    if self.stop_event.wait(3):  # Reduced from 5s
+                        continue
+                if attempt:
+                    session.login()  # page looks healthy but dialing keeps failing
+                else:
+                    session.ensure_ready()
+
+        slot["next"] = self._next(session, block=False)  # stage while it rings
+        outcome = session.wait_for_outcome()
+        outcome["attempt"] = contact.get("attempt", 1)
+        outcome["redial_in"] = self._redial_delay(outcome)
+        METRICS.inc("dialer_calls_total", outcome=outcome["status"])
+        instant("outcome", number=num, status=outcome["status"], duration=outcome["duration"])
+        if outcome["status"] == "answered":
+            self._unstage(slot)  # on_result may take minutes; let idle lines dial it
+        with METRICS.time("result"), span("on_result", status=outcome["status"]):
+            self.on_result(session, contact, outcome)
+        if outcome["redial_in"] is not None:
+            METRICS.inc("dialer_redials_total")
+            self.work.schedule(dict(contact, attempt=outcome["attempt"] + 1), outcome["redial_in"])
+            session.log(
+                f"🔁 تماس مجدد با {num} تا {outcome['redial_in'] / 60:.0f} دقیقه دیگر "
+                f"(تلاش {outcome['attempt'] + 1}/{self.config['redial']['max_attempts']})"
+            )
+        session.wait_idle()  # only as long as the page needs, was a fixed 0.5s
+
+    def _redial_delay(self, outcome):
+        """Seconds until the next attempt, or None if the contact is finished."""
+        cfg = self.config["redial"]
+        base = cfg["backoff"].get(outcome["status"])
+        if base is None or outcome["attempt"] >= cfg["max_attempts"]:
+            return None
+        return float(base) * float(cfg["factor"]) ** (outcome["attempt"] - 1)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Call detail records.
+
+Every call produces one CDR row.  Rows are buffered and written as Parquet
+part files under cdr/date=YYYY-MM-DD/ (hive-style, one partition per local
+day).  Aggregations read only the columns they need through pyarrow.dataset
+and group inside Arrow, so answer-rate reports over millions of calls stay
+interactive.
+
+Timings: ring_s is dial -> pause indicator appearing (dial -> decision when
+it never appeared), like the "ring" stage metric; indicator_s how long the
+indicator was seen before the decision; talk_s indicator appearing -> end of
+our side of the call, for answered calls.
+"""
+
+import glob
+import os
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from metrics import METRICS
+
+CDR_DIR = "cdr"
+
+SCHEMA = pa.schema([
+    ("number", pa.string()),
+    ("category", pa.string()),
+    ("session", pa.string()),
+    ("dialed_at", pa.float64()),
+    ("decided_at", pa.float64()),
+    ("ended_at", pa.float64()),
+    ("hour", pa.int8()),
+    ("status", pa.string()),
+    ("attempt", pa.int16()),
+    ("ring_s", pa.float32()),
+    ("indicator_s", pa.float32()),
+    ("talk_s", pa.float32()),
+    ("audio_played", pa.bool_()),
+])
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+
+def _write_part(part_dir, table):
+    # dot-prefixed temp name: dataset discovery skips it until the rename
+    name = f"part-{time.time_ns()}.parquet"
+    tmp = os.path.join(part_dir, f".{name}.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, os.path.join(part_dir, name))
+
+
+def call_record(session_name, contact, outcome, audio_played, ended=None):
+    """CDR dict for one finished call (outcome as returned by wait_for_outcome)."""
+    ended = time.time() if ended is None else ended
+    answered = outcome["status"] == "answered"
+    up_at = outcome["decided_at"] - outcome["duration"]  # pause indicator appeared
+    return {
+        "number": contact["number"],
+        "category": contact.get("category"),
+        "session": session_name,
+        "dialed_at": outcome["dialed_at"],
+        "decided_at": outcome["decided_at"],
+        "ended_at": ended,
+        "status": outcome["status"],
+        "attempt": outcome.get("attempt", 1),
+        "ring_s": up_at - outcome["dialed_at"],
+        "indicator_s": outcome["duration"],
+        "talk_s": ended - up_at if answered else 0.0,
+        "audio_played": audio_played,
+    }
+
+
+class CdrStore:
+    def __init__(self, root=CDR_DIR, flush_rows=200, flush_secs=30):
+        self.root = root
+        self.flush_rows = flush_rows
+        self._lock = threading.Lock()
+        self._buf = []
+        self._stop = threading.Event()
+        self._kick = threading.Event()  # buffer full: flush now
+        self._flusher = threading.Thread(target=self._flush_loop, args=(flush_secs,), daemon=True)
+        self._flusher.start()
+
+    # ---- writing ----
+    def add(self, rec):
+        """Buffer one CDR dict (keys of SCHEMA except hour)."""
+        lt = time.localtime(rec["dialed_at"])
+        rec = dict(rec, hour=lt.tm_hour, date=time.strftime("%Y-%m-%d", lt))
+        if not isinstance(rec.get("category"), str):
+            rec["category"] = None
+        with self._lock:
+            self._buf.append(rec)
+            full = len(self._buf) >= self.flush_rows
+        if full:
+            self._kick.set()  # the flusher thread writes it, not the caller
+
+    def flush(self):
+        with self._lock:
+            rows, self._buf = self._buf, []
+        if not rows:
+            return
+        t0 = time.perf_counter()
+        by_date = {}
+        for r in rows:
+            by_date.setdefault(r.pop("date"), []).append(r)
+        for date, recs in by_date.items():
+            part = os.path.join(self.root, f"date={date}")
+            os.makedirs(part, exist_ok=True)
+            _write_part(part, pa.Table.from_pylist(recs, schema=SCHEMA))
+        METRICS.observe("cdr_flush", time.perf_counter() - t0)
+
+    def _flush_loop(self, every):
+        while not self._stop.is_set():
+            self._kick.wait(every)
+            self._kick.clear()
+            if not self._stop.is_set():
+                self.flush()
+
+    def close(self):
+        self._stop.set()
+        self._kick.set()
+        self._flusher.join()
+        self.flush()
+
+    def compact(self, keep_today=True):
+        """Merge the part files of each finished day into one file."""
+        today = time.strftime("%Y-%m-%d")
+        for part in glob.glob(os.path.join(self.root, "date=*")):
+            if keep_today and part.endswith(today):
+                continue
+            files = sorted(glob.glob(os.path.join(part, "part-*.parquet")))
+            if len(files) < 2:
+                continue
+            _write_part(part, pa.concat_tables(pq.read_table(f, schema=SCHEMA) for f in files))
+            for f in files:
+                os.remove(f)
+
+    # ---- reading ----
+    def _dataset(self):
+        return ds.dataset(self.root, format="parquet", schema=SCHEMA.append(
+            pa.field("date", pa.string())), partitioning=PARTITIONING)
+
+    def table(self, columns=None, start=None, end=None):
+        """CDRs (optionally only some columns) for dates start..end (YYYY-MM-DD)."""
+        if not os.path.isdir(self.root):
+            return SCHEMA.empty_table() if columns is None else SCHEMA.empty_table().select(columns)
+        flt = None
+        if start:
+            flt = ds.field("date") >= start
+        if end:
+            cond = ds.field("date") <= end
+            flt = cond if flt is None else flt & cond
+        return self._dataset().to_table(columns=columns, filter=flt)
+
+    def answer_rate(self, by=("category", "hour"), start=None, end=None):
+        """Calls, answered calls and answer rate grouped by the given columns."""
+        by = list(by)
+        t = self.table(columns=by + ["status"], start=start, end=end)
+        t = t.append_column("answered", pc.cast(pc.equal(t["status"], "answered"), pa.int64()))
+        g = t.group_by(by).aggregate([("status", "count"), ("answered", "sum")])
+        g = g.select(by + ["status_count", "answered_sum"]).rename_columns(by + ["calls", "answered"])
+        rate = pc.divide(pc.cast(g["answered"], pa.float64()), pc.cast(g["calls"], pa.float64()))
+        return g.append_column("answer_rate", rate).to_pandas().sort_values(by).reset_index(drop=True)
+
+    def export_csv(self, path, start=None, end=None):
+        import pyarrow.csv as pacsv
+
+        pacsv.write_csv(self.table(start=start, end=end), path)
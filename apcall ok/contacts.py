@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Indexed in-memory contact store.
+
+The loaded dataframe is kept as-is; next to it the store builds a hash index
+phone -> rows, category -> row arrays and flat numpy status arrays (called
+bitmap, outcome code, call time).  Lookups and status updates touch only
+those arrays, filters return row-index arrays instead of copying the frame.
+"""
+
+import numpy as np
+import pandas as pd
+
+NAME_COL = "نام"
+CAT_COL = "دسته‌بندی"
+PHONE_COL = "شماره موبایل"
+
+# outcome codes stored per row; 0 = not called yet.  Append only: the codes
+# index this tuple and must stay stable.
+OUTCOMES = ("", "answered", "ended_after_answer", "powered_off_or_busy", "no_answer",
+            "voicemail", "announcement")
+OUTCOME_CODE = {s: i for i, s in enumerate(OUTCOMES)}
+
+_NO_ROWS = np.empty(0, dtype=np.intp)
+
+
+class ContactStore:
+    def __init__(self, df=None):
+        self.load(df)
+
+    def load(self, df=None):
+        if df is None:
+            df = pd.DataFrame(columns=[NAME_COL, CAT_COL, PHONE_COL])
+        df = df.reset_index(drop=True)
+        n = len(df)
+        self.df = df
+
+        self.names = df[NAME_COL].to_numpy(dtype=object)
+        self.phones = df[PHONE_COL].to_numpy(dtype=object)
+        self.category = df[CAT_COL].to_numpy(dtype=object)
+
+        self.called = (
+            df["Called"].fillna(False).to_numpy(dtype=bool, copy=True)
+            if "Called" in df.columns else np.zeros(n, dtype=bool)
+        )
+        if "Outcome" in df.columns:
+            self.outcome = (
+                df["Outcome"].map(OUTCOME_CODE).fillna(0).to_numpy(dtype=np.int8, copy=True)
+            )
+        else:
+            self.outcome = np.zeros(n, dtype=np.int8)
+        if "CalledAt" in df.columns:
+            self.called_at = pd.to_numeric(df["CalledAt"], errors="coerce").to_numpy(dtype=float, copy=True)
+        else:
+            self.called_at = np.full(n, np.nan)
+
+        rows = pd.Series(np.arange(n, dtype=np.intp))
+        self._all = rows.to_numpy()
+        # phones are nearly unique: plain dict to the last row, groups only for repeats
+        self._by_phone = dict(zip(self.phones.tolist(), range(n)))
+        dup = pd.Series(self.phones).duplicated(keep=False).to_numpy()
+        dup_rows = self._all[dup]
+        self._dup_phone = {
+            phone: dup_rows[pos]
+            for phone, pos in pd.Series(dup_rows).groupby(self.phones[dup]).indices.items()
+        } if dup.any() else {}
+        self._by_category = rows.groupby(self.category).indices if n else {}
+
+    def append(self, df):
+        """Add rows after the current ones (statuses of existing rows are kept)."""
+        if len(self):
+            df = pd.concat([self.to_frame(), df], ignore_index=True)
+        self.load(df)
+
+    def __len__(self):
+        return len(self.phones)
+
+    def categories(self):
+        return sorted(self._by_category)
+
+    def rows(self, category=None):
+        """Ascending row positions, for every contact or one category."""
+        if category is None:
+            return self._all
+        return self._by_category.get(category, _NO_ROWS)
+
+    def rows_for(self, phone):
+        rows = self._dup_phone.get(phone)
+        if rows is not None:
+            return rows
+        i = self._by_phone.get(phone)
+        return _NO_ROWS if i is None else self._all[i:i + 1]
+
+    def contact(self, row):
+        return {
+            "name": self.names[row],
+            "number": self.phones[row],
+            "category": self.category[row],
+        }
+
+    def mark(self, phone, status, ts):
+        """Record a call outcome for every row with this phone; returns the rows."""
+        rows = self.rows_for(phone)
+        self.called[rows] = True
+        self.outcome[rows] = OUTCOME_CODE.get(status, 0)
+        self.called_at[rows] = ts
+        return rows
+
+    def to_frame(self):
+        """Copy of the contacts with the live status arrays written back."""
+        df = self.df.copy()
+        df["Called"] = self.called
+        df["Outcome"] = np.array(OUTCOMES, dtype=object)[self.outcome]
+        df.loc[self.outcome == 0, "Outcome"] = None
+        df["CalledAt"] = self.called_at
+        return df
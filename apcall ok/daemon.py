@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Headless dialer daemon – the campaign runtime of the Tk app without Tk, the
+keyboard hook or (unless --audio is given) pygame, controlled over a small
+local HTTP/JSON API.  Each instance works in its own directory (config.json,
+contacts, journal, CDRs and logs), so several campaigns can run per host:
+
+    python daemon.py --workdir campaigns/a --port 8701
+    python daemon.py --workdir campaigns/b --port 8702 --audio
+
+API (JSON bodies and replies):
+    GET  /status                  contacts, campaign progress, sessions
+    GET  /events                  NDJSON stream: {"type": "log"|"result", ...}
+    GET  /report?by=category,hour answer rate from the CDRs
+    GET  /metrics                 Prometheus text: stage latencies, call counters
+    POST /contacts                {"path": "list.xlsx"}
+    POST /dnc                     {"path": "optouts.csv"} and/or {"numbers": [...]}
+    POST /campaign/start          {"category": null, "numbers": null, "resume": false}
+    POST /campaign/pause | /campaign/resume | /campaign/stop
+    POST /hangup                  end the answered calls waiting for hang-up
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from sessions import SessionPool
+from settings import load_config
+from campaign import CampaignEngine
+from importer import import_contacts
+from logpipe import LogPipeline
+from dnc import read_numbers, to_keys
+from metrics import CONTENT_TYPE, METRICS
+from tracing import TRACER, start_from_config
+from workspace import Workspace
+
+EVENT_DRAIN_SECS = 0.1
+SUBSCRIBER_QUEUE = 1000  # events kept for a slow /events client before dropping
+
+
+class DialerDaemon:
+    def __init__(self, play_audio=False, headless=True, trace=None):
+        self.log_pipe = LogPipeline()
+        self.config = load_config()
+        if trace:
+            self.config["trace"]["file"] = trace
+        if start_from_config(self.config):
+            self.log(f"🧵 ردیابی در {self.config['trace']['file']} ثبت می‌شود.")
+
+        self.ws = Workspace(self.config, self.log)
+        self.store, self.contacts_lock = self.ws.store, self.ws.lock
+        self.journal, self.cdr, self.dnc = self.ws.journal, self.ws.cdr, self.ws.dnc
+
+        self.engine = None
+        self._engine_lock = threading.Lock()
+        self.progress = {"total": 0, "done": 0, "answered": 0, "started_at": None}
+
+        self._subscribers = set()
+        self._sub_lock = threading.Lock()
+        self._closed = threading.Event()
+        threading.Thread(target=self._pump_log, daemon=True).start()
+
+        self.audio_cache = None
+        self.audio_path = None
+        self.audio_lock = threading.Lock()
+        if play_audio:
+            self._init_audio()
+
+        self.pool = SessionPool(self.config, self.log, headless)
+        if self.config["audio"].get("detect_answer"):
+            from audio import open_line_monitor  # pygame only when line analysis is on
+            open_line_monitor(self.config["audio"], self.log)
+        self.ws.load_saved()
+
+    def _init_audio(self):
+        from audio import AudioCache, init_mixer
+
+        audio_cfg = self.config["audio"]
+        device = init_mixer(audio_cfg["sample_rate"], audio_cfg["output_index"])
+        self.log(f"🔈 خروجی صدا: {device or 'پیش‌فرض سیستم'}")
+        self.audio_cache = AudioCache(max_bytes=audio_cfg["cache_mb"] * 1024 * 1024)
+        files = self.config["audio_files"]
+        idx = self.config["audio_current_index"]
+        if 0 <= idx < len(files) and os.path.exists(files[idx]):
+            self.audio_path = files[idx]
+            self.audio_cache.preload([self.audio_path], self.log)
+            self.log(f"🔊 صوت فعلی: {os.path.basename(self.audio_path)}")
+        else:
+            self.log("⚠️ فایل صوتی در تنظیمات یافت نشد؛ تماس‌ها بدون پخش صوت انجام می‌شوند.")
+
+    # ---- events ----
+    def log(self, msg):
+        self.log_pipe.log(msg)
+
+    def publish(self, event):
+        with self._sub_lock:
+            subs = list(self._subscribers)
+        for q in subs:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def subscribe(self):
+        q = queue.Queue(SUBSCRIBER_QUEUE)
+        with self._sub_lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._sub_lock:
+            self._subscribers.discard(q)
+
+    def _pump_log(self):
+        # the pipeline's UI queue feeds /events instead of a log widget
+        while not self._closed.wait(EVENT_DRAIN_SECS):
+            for line in self.log_pipe.drain():
+                self.publish({"type": "log", "line": line})
+
+    # ---- contacts ----
+    def load_contacts(self, path):
+        """Import a contact list; raises ValueError for bad files."""
+        with self._engine_lock:
+            if self.engine:
+                raise RuntimeError("کمپین در حال اجراست.")
+        self.log(f"📥 در حال خواندن {os.path.basename(path)}...")
+        df, digest, cached = import_contacts(path)
+        # parsed unlocked; the merge and journal reset must not race start_campaign
+        with self._engine_lock:
+            if self.engine:  # started while the file was being parsed
+                raise RuntimeError("کمپین در حال اجراست.")
+            return self.ws.add_contacts(df, digest, cached)
+
+    def add_dnc(self, path=None, numbers=None):
+        """Add a file and/or a list of numbers to the do-not-call index."""
+        if path is None and numbers is None:
+            raise ValueError("path یا numbers لازم است.")
+        added = 0
+        if path is not None:
+            added += self.dnc.add(read_numbers(path))
+        if numbers is not None:
+            added += self.dnc.add(to_keys(numbers))
+        self.log(f"🚫 {added} شماره به فهرست عدم تماس افزوده شد (مجموع {len(self.dnc)}).")
+        return {"added": added, "total": len(self.dnc)}
+
+    # ---- campaign ----
+    def start_campaign(self, category=None, numbers=None, resume=False):
+        with self._engine_lock:
+            if self.engine:
+                raise RuntimeError("کمپین در حال اجراست.")
+            if resume:
+                contacts = self.journal.pending_campaign()
+                if not contacts:
+                    raise ValueError("کمپین ناتمامی وجود ندارد.")
+            else:
+                rows = self.store.rows(category)
+                if numbers is not None:
+                    wanted = set(numbers)
+                    rows = [r for r in rows if self.store.phones[r] in wanted]
+                contacts = [self.store.contact(r) for r in rows]
+                if not contacts:
+                    raise ValueError("مخاطبی برای تماس وجود ندارد.")
+                self.journal.start_campaign(contacts)
+
+            engine = self.engine = CampaignEngine(
+                self.pool, self.config, self.log, self._on_call_result, self.dnc
+            )
+            self.progress = {"total": len(contacts), "done": 0, "answered": 0,
+                             "started_at": time.time()}
+        threading.Thread(target=self._run, args=(engine, contacts), daemon=True).start()
+        return len(contacts)
+
+    def _run(self, engine, contacts):
+        try:
+            self.ws.run_campaign(engine, contacts)
+        except Exception as e:
+            self.log(f"❌ خطا در تماس‌ها: {e}")
+        finally:
+            with self._engine_lock:
+                self.engine = None
+            self.publish({"type": "campaign", "state": "idle", **self.progress})
+
+    def _engine(self):
+        engine = self.engine
+        if engine is None:
+            raise RuntimeError("کمپینی در حال اجرا نیست.")
+        return engine
+
+    def pause(self):
+        self._engine().pause()
+        self.log("⏸️ کمپین متوقف موقت شد.")
+
+    def resume(self):
+        self._engine().resume()
+        self.log("▶️ ادامه کمپین.")
+
+    def stop(self):
+        engine = self._engine()
+        engine.stop()
+        self.log("⏹️ توقف کمپین درخواست شد؛ تماس‌های جاری تمام می‌شوند.")
+
+    def hangup(self):
+        active = [s for s in self.pool.sessions if s.call_active]
+        for s in active:
+            try:
+                s.hangup()
+            except Exception as e:
+                s.log(f"⚠️ خطا در اجرای قطع تماس: {e}")
+        return len(active)
+
+    def _on_call_result(self, session, contact, outcome):
+        """Runs on the dialing session's worker thread."""
+        status, dur = outcome["status"], outcome["duration"]
+
+        self.ws.record(contact, outcome)
+        with self.contacts_lock:
+            self.progress["done"] += 1
+            self.progress["answered"] += status == "answered"
+
+        category = contact.get("category")
+        self.publish({
+            "type": "result",
+            "number": contact["number"],
+            "name": contact.get("name"),
+            "category": category if isinstance(category, str) else None,
+            "session": session.name,
+            "status": status,
+            "duration": dur,
+            "attempt": outcome.get("attempt", 1),
+            "redial_in": outcome.get("redial_in"),
+        })
+
+        play = self._play_audio_message if self.audio_path else None
+        self.ws.finish_call(session, contact, outcome, play, hangup_by="(POST /hangup)")
+
+    def _play_audio_message(self, session):
+        from audio import play_into_call
+
+        audio_cfg = self.config["audio"]
+        return play_into_call(
+            session, self.audio_cache.get(self.audio_path),
+            audio_cfg["repeat"], audio_cfg["delay"], self.audio_lock,
+        )
+
+    # ---- reporting ----
+    def status(self):
+        engine = self.engine
+        if engine is None:
+            state, queued = "idle", 0
+        else:
+            state = "paused" if engine.paused else "running"
+            queued = len(engine.work)
+        with self.contacts_lock:
+            contacts, called = len(self.store), int(self.store.called.sum())
+        return {
+            "contacts": contacts,
+            "called": called,
+            "campaign": dict(self.progress, state=state, queued=queued),
+            "pending_resume": 0 if engine else len(self.journal.pending_campaign()),
+            "sessions": [
+                {"name": s.name, "in_call": s.call_active} for s in self.pool.sessions
+            ],
+        }
+
+    def report(self, by):
+        self.cdr.flush()
+        df = self.cdr.answer_rate(by=by)
+        df["category"] = df["category"].where(df["category"].notna(), None)
+        return df.to_dict(orient="records")
+
+    def close(self):
+        if self.engine:
+            self.engine.stop()
+        self.pool.close()
+        self.ws.close()
+        TRACER.stop()
+        self._closed.set()
+        self.log_pipe.close()
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    daemon = None  # set on the server-specific subclass
+
+    def log_message(self, fmt, *args):
+        pass  # requests are not worth a line in dialer.jsonl
+
+    def _reply(self, code, body):
+        data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        if not n:
+            return {}
+        return json.loads(self.rfile.read(n).decode("utf-8"))
+
+    def _dispatch(self, routes, *args):
+        handler = routes.get(urlparse(self.path).path.rstrip("/"))
+        if handler is None:
+            return self._reply(404, {"error": "not found"})
+        try:
+            result = handler(*args)
+        except (ValueError, KeyError, TypeError) as e:
+            return self._reply(400, {"error": str(e)})
+        except RuntimeError as e:
+            return self._reply(409, {"error": str(e)})
+        except Exception as e:
+            return self._reply(500, {"error": str(e)})
+        if result is not None:
+            self._reply(200, result)
+
+    def do_GET(self):
+        d = self.daemon
+        query = parse_qs(urlparse(self.path).query)
+        self._dispatch({
+            "/status": d.status,
+            "/events": self._stream_events,
+            "/metrics": self._metrics,
+            "/report": lambda: d.report(
+                [c for c in query.get("by", ["category"])[0].split(",") if c]
+            ),
+        })
+
+    def do_POST(self):
+        d = self.daemon
+
+        def start():
+            body = self._body()
+            n = d.start_campaign(body.get("category"), body.get("numbers"),
+                                 bool(body.get("resume")))
+            return {"ok": True, "contacts": n}
+
+        def simple(fn):
+            return lambda: fn() or {"ok": True}
+
+        self._dispatch({
+            "/contacts": lambda: d.load_contacts(self._body()["path"]),
+            "/dnc": lambda: d.add_dnc(**self._body()),
+            "/campaign/start": start,
+            "/campaign/pause": simple(d.pause),
+            "/campaign/resume": simple(d.resume),
+            "/campaign/stop": simple(d.stop),
+            "/hangup": lambda: {"ok": True, "hung_up": d.hangup()},
+        })
+
+    def _metrics(self):
+        data = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream_events(self):
+        q = self.daemon.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write((json.dumps({"type": "status", **self.daemon.status()},
+                                         ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+            self.wfile.flush()
+            while True:
+                try:
+                    event = q.get(timeout=15)
+                    line = json.dumps(event, ensure_ascii=False, default=str)
+                except queue.Empty:
+                    line = ""  # keep-alive; also notices closed clients
+                self.wfile.write((line + "\n").encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.daemon.unsubscribe(q)
+
+
+def serve(daemon, host="127.0.0.1", port=8765):
+    handler = type("Handler", (ApiHandler,), {"daemon": daemon})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    daemon.log(f"🌐 API در http://{host}:{port} آماده است.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Headless contact dialer with a local JSON API")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--workdir", default=".", help="config, contacts, CDRs and logs of this instance")
+    ap.add_argument("--audio", action="store_true", help="play the configured audio file on answer")
+    ap.add_argument("--visible", action="store_true", help="show the Firefox windows")
+    ap.add_argument("--trace", help="write a Chrome trace of the run here (see tracing.py)")
+    args = ap.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir)
+    daemon = DialerDaemon(play_audio=args.audio, headless=not args.visible, trace=args.trace)
+    serve(daemon, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
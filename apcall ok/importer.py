@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Streaming contact import for Excel (.xlsx/.xls), CSV and Parquet lists.
+
+Rows are read in chunks (openpyxl read-only iteration, chunked read_csv,
+Parquet record batches), numbers are normalized per chunk with vectorized
+string ops, and progress is reported after every chunk.  Parsed lists are
+cached on disk by content hash so re-opening the same file skips parsing.
+
+Normalization makes +98…, 0098…, Persian/Arabic digits and spaced or dashed
+numbers compare equal; dedupe_contacts() then merges repeats within a list
+and against the numbers already loaded, and reports what it merged.
+"""
+
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from contacts import NAME_COL, CAT_COL, PHONE_COL
+
+REQUIRED = (NAME_COL, CAT_COL, PHONE_COL)
+OPTIONAL = ("Called",)
+CHUNK_ROWS = 50_000
+CACHE_DIR = "import_cache"
+CACHE_VERSION = 4  # bump when parsing/normalization changes
+MERGE_REPORT = "import_merged.csv"
+
+_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+
+
+def file_digest(path) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _from_sci(v: str) -> str:
+    """'9.123456789E+09' -> '9123456789'; empty when the mantissa has fewer
+    digits than the number (9.12346E+09), i.e. Excel rounded the rest away."""
+    digits = v.lower().split("e")[0].replace(".", "").lstrip("0")
+    n = str(int(float(v)))
+    return n if len(digits) >= len(n) else ""
+
+
+def normalize_numbers(s: pd.Series) -> pd.Series:
+    """Canonical Iranian mobile numbers (09123456789), vectorized.
+
+    Persian/Arabic-Indic digits become ASCII, numbers Excel stored as floats
+    (9123456789.0, 9.123456789e9) are read back as integers – unless the
+    scientific notation kept too few digits to recover the number –,
+    separators are dropped, a +98 / 0098 / 98 country prefix becomes the
+    leading 0, and the rest is zero-padded to 11 digits as before.  Anything that is then not
+    09 and nine digits – no digits at all, foreign or landline numbers –
+    comes back empty."""
+    s = s.astype(str).str.strip().str.translate(_DIGITS)
+    sci = s.str.fullmatch(r"\d+(?:\.\d*)?[eE]\+?\d+")
+    if sci.any():
+        s = s.copy()
+        s[sci] = [_from_sci(v) for v in s[sci]]
+    s = s.str.replace(r"\.0*$", "", regex=True).str.replace(r"[^\d+]", "", regex=True)
+    s = s.str.replace(r"^(?:\+|00)980?", "0", regex=True)
+    s = s.str.replace(r"^98(?=9\d{9}$)", "0", regex=True)
+    s = s.where(~s.str.startswith("+"), "")  # another country code
+    s = s.str.zfill(11)
+    return s.where(s.str.fullmatch(r"09\d{9}"), "")
+
+
+def _finish_chunk(df):
+    df = df[df[PHONE_COL].notna()].copy()
+    df[PHONE_COL] = normalize_numbers(df[PHONE_COL])
+    kept = df[df[PHONE_COL] != ""]
+    kept.attrs["rejected"] = len(df) - len(kept)
+    return kept
+
+
+def dedupe_contacts(df, known=()):
+    """Drop repeated numbers within df and numbers already in known.
+
+    Returns (kept rows, merge report); the report has one row per dropped
+    contact with its name, number and reason ("duplicate" in this list or
+    "existing" in the loaded list)."""
+    phones = df[PHONE_COL]
+    repeat = phones.duplicated(keep="first").to_numpy()
+    existing = phones.isin(known).to_numpy() & ~repeat
+    drop = repeat | existing
+    report = df.loc[drop, [NAME_COL, PHONE_COL]].reset_index(drop=True)
+    report["reason"] = np.where(repeat[drop], "duplicate", "existing")
+    return df[~drop].reset_index(drop=True), report
+
+
+def save_merge_report(report, path=MERGE_REPORT):
+    """Write a dedupe_contacts() report as CSV; returns (duplicate, existing) counts."""
+    report.to_csv(path, index=False, encoding="utf-8-sig")
+    existing = int((report["reason"] == "existing").sum())
+    return len(report) - existing, existing
+
+
+def _check_columns(columns):
+    missing = [c for c in REQUIRED if c not in columns]
+    if missing:
+        raise ValueError(f"ستون‌های لازم موجود نیست: {', '.join(missing)}")
+    return [c for c in REQUIRED + OPTIONAL if c in columns]
+
+
+def _read_xlsx(path, progress):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        total = ws.max_row  # may be None when the sheet has no dimension record
+        rows = ws.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+        cols = _check_columns(header)
+        pos = [header.index(c) for c in cols]
+
+        chunks, buf, done = [], [], 0
+        for row in rows:
+            buf.append([row[p] if p < len(row) else None for p in pos])
+            if len(buf) >= CHUNK_ROWS:
+                chunks.append(_finish_chunk(pd.DataFrame(buf, columns=cols)))
+                done += len(buf)
+                buf = []
+                progress(done, done / total if total else None)
+        if buf:
+            chunks.append(_finish_chunk(pd.DataFrame(buf, columns=cols)))
+            done += len(buf)
+        progress(done, 1.0)
+    finally:
+        wb.close()
+    return chunks
+
+
+def _read_xls(path, progress):
+    # legacy .xls has no streaming reader; still avoid per-cell converters
+    df = pd.read_excel(path, dtype={PHONE_COL: str})
+    cols = _check_columns(df.columns)
+    progress(len(df), 1.0)
+    return [_finish_chunk(df[cols])]
+
+
+def _read_csv(path, progress):
+    size = os.path.getsize(path) or 1
+    chunks, done, cols = [], 0, None
+    with open(path, "rb") as f:
+        reader = pd.read_csv(f, chunksize=CHUNK_ROWS, dtype={PHONE_COL: str}, encoding="utf-8-sig")
+        for chunk in reader:
+            if cols is None:
+                cols = _check_columns(chunk.columns)
+            chunks.append(_finish_chunk(chunk[cols]))
+            done += len(chunk)
+            progress(done, f.tell() / size)
+    progress(done, 1.0)
+    return chunks
+
+
+def _read_parquet(path, progress):
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(path)
+    cols = _check_columns(pf.schema_arrow.names)
+    total = pf.metadata.num_rows or 1
+    chunks, done = [], 0
+    for batch in pf.iter_batches(batch_size=CHUNK_ROWS, columns=cols):
+        chunk = batch.to_pandas()
+        chunks.append(_finish_chunk(chunk))
+        done += len(chunk)
+        progress(done, done / total)
+    progress(done, 1.0)
+    return chunks
+
+
+READERS = {
+    ".xlsx": _read_xlsx,
+    ".xlsm": _read_xlsx,
+    ".xls": _read_xls,
+    ".csv": _read_csv,
+    ".parquet": _read_parquet,
+}
+
+
+def import_contacts(path, progress=None, cache_dir=CACHE_DIR):
+    """Read a contact list; returns (dataframe, content digest, from_cache).
+
+    df.attrs["rejected"] counts the rows dropped for not holding an Iranian
+    mobile number.  progress(rows_read, fraction or None) is called from the reading thread.
+    Raises ValueError for unsupported files or missing columns."""
+    progress = progress or (lambda rows, frac: None)
+    reader = READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        raise ValueError(f"نوع فایل پشتیبانی نمی‌شود: {os.path.basename(path)}")
+
+    digest = file_digest(path)
+    cached = os.path.join(cache_dir, f"{digest}_v{CACHE_VERSION}.pkl")
+    if os.path.exists(cached):
+        with open(cached, "rb") as f:
+            df = pickle.load(f)
+        progress(len(df), 1.0)
+        return df, digest, True
+
+    chunks = reader(path, progress)
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=list(REQUIRED))
+    df.attrs["rejected"] = sum(c.attrs.get("rejected", 0) for c in chunks)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = cached + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(df, f)
+    os.replace(tmp, cached)
+    return df, digest, False
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Crash-safe contact persistence.
+
+contacts.pkl holds a snapshot of the contacts dataframe and is only rewritten
+(atomically) when a list is loaded or when the journal is compacted.  Every call
+outcome is appended to a SQLite journal in WAL mode – one small insert per call –
+and replayed over the snapshot at startup.  The journal also remembers the
+queue of the running campaign, with each contact's attempt count and pending
+redial time, so it can be resumed after a crash where it stopped.
+
+record() only queues the outcome: a writer thread commits whatever has queued
+up in one transaction and triggers compaction, so dialing never waits for
+the disk.
+"""
+
+import os
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from contacts import PHONE_COL
+from metrics import METRICS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    number TEXT NOT NULL,
+    status TEXT NOT NULL,
+    duration REAL NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS campaign (
+    pos INTEGER PRIMARY KEY,
+    number TEXT NOT NULL,
+    name TEXT,
+    category TEXT,
+    done INTEGER NOT NULL DEFAULT 0,
+    attempt INTEGER NOT NULL DEFAULT 1,
+    due REAL
+);
+CREATE INDEX IF NOT EXISTS campaign_number ON campaign(number);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def apply_events(df, events):
+    """Fold journal events (number/status/ts, oldest first) into df in place."""
+    if events.empty or df.empty:
+        return df
+    last = events.drop_duplicates("number", keep="last").set_index("number")
+    hit = df[PHONE_COL].isin(last.index)
+    nums = df.loc[hit, PHONE_COL]
+    df.loc[hit, "Called"] = True
+    df.loc[hit, "Outcome"] = nums.map(last["status"])
+    df.loc[hit, "CalledAt"] = nums.map(last["ts"])
+    return df
+
+
+class ContactJournal:
+    def __init__(self, snapshot_path, db_path, compact_every=500, snapshot=None):
+        self.snapshot_path = snapshot_path
+        self.compact_every = compact_every
+        # () -> private copy of the contacts frame; marks must precede record()
+        self.snapshot = snapshot
+        self.last_error = None
+        self._lock = threading.Lock()
+        # serializes snapshot writes; taken before _lock, never inside it
+        self._snapshot_lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is enough in WAL mode to survive a crash of this process
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        cols = {r[1] for r in self._db.execute("PRAGMA table_info(campaign)")}
+        for col, decl in (("attempt", "INTEGER NOT NULL DEFAULT 1"), ("due", "REAL")):
+            if col not in cols:  # journal from an older version
+                self._db.execute(f"ALTER TABLE campaign ADD COLUMN {col} {decl}")
+        self._pending = self._db.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        self._last_id = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        self._compacting = False
+        self._generation = 0  # bumped by reset/clear; older queued outcomes are dropped
+        self._queue = queue.Queue()
+        threading.Thread(target=self._writer, daemon=True).start()
+
+    # ---- snapshot ----
+    def load(self):
+        """Snapshot with journaled outcomes replayed, or None if nothing is stored."""
+        if not os.path.exists(self.snapshot_path):
+            return None
+        with open(self.snapshot_path, "rb") as f:
+            df = pickle.load(f)
+        for col, default in (("Called", False), ("Outcome", None), ("CalledAt", None)):
+            if col not in df.columns:
+                df[col] = default
+        with self._lock:
+            events = pd.read_sql_query(
+                "SELECT number, status, ts FROM events ORDER BY id", self._db
+            )
+        return apply_events(df, events)
+
+    def _write_snapshot(self, df):
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(df, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+
+    def reset(self, df, list_hash=None):
+        """Store a freshly loaded list; earlier outcomes no longer apply."""
+        with self._snapshot_lock:
+            with self._lock:
+                self._generation += 1
+                self._db.execute("DELETE FROM events")
+                self._db.execute("DELETE FROM campaign")
+                self._db.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('list_hash', ?)", (list_hash,)
+                )
+                self._db.commit()
+                self._pending = 0
+            self._write_snapshot(df)
+
+    def clear(self):
+        with self._snapshot_lock:
+            with self._lock:
+                self._generation += 1
+                self._db.execute("DELETE FROM events")
+                self._db.execute("DELETE FROM campaign")
+                self._db.execute("DELETE FROM meta WHERE key = 'list_hash'")
+                self._db.commit()
+                self._pending = 0
+            if os.path.exists(self.snapshot_path):
+                os.remove(self.snapshot_path)
+
+    def list_hash(self):
+        """Content hash of the file the stored list was imported from."""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'list_hash'").fetchone()
+        return row[0] if row else None
+
+    # ---- per-call journal ----
+    def record(self, number, status, duration, ts=None, final=True, attempt=1, due=None):
+        """Queue one outcome for the writer thread; never waits for the disk.
+
+        A non-final outcome (redial scheduled at wall-clock time due) keeps
+        the contact pending in the campaign queue, as attempt + 1."""
+        self._queue.put((self._generation, number, status, duration, ts or time.time(), final,
+                         attempt, due))
+
+    def flush(self):
+        """Wait until every queued outcome is committed."""
+        self._queue.join()
+
+    def _writer(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while True:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                if self._commit(batch) and self.snapshot is not None:
+                    generation = self._generation  # read before the copy is taken
+                    self.compact_async(self.snapshot(), generation)
+            except Exception as e:
+                self.last_error = e
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _commit(self, batch) -> bool:
+        """Write a batch in one transaction; returns True when a compaction is due."""
+        with self._lock, METRICS.time("journal_commit"):
+            batch = [b for b in batch if b[0] == self._generation]
+            if not batch:
+                return False
+            self._db.executemany(
+                "INSERT INTO events (number, status, duration, ts) VALUES (?, ?, ?, ?)",
+                [b[1:5] for b in batch],
+            )
+            self._db.executemany(
+                "UPDATE campaign SET done = 1 WHERE number = ?", [(b[1],) for b in batch if b[5]]
+            )
+            self._db.executemany(
+                "UPDATE campaign SET attempt = ?, due = ? WHERE number = ?",
+                [(b[6] + 1, b[7], b[1]) for b in batch if not b[5]],
+            )
+            self._db.commit()
+            self._last_id = self._db.execute("SELECT MAX(id) FROM events").fetchone()[0]
+            self._pending += len(batch)
+            return self._pending >= self.compact_every and not self._compacting
+
+    def compact_async(self, df, generation=None):
+        """Fold events up to now into a new snapshot of df (a private copy).
+
+        df must already reflect every recorded outcome, which holds when the
+        store is marked before record() is called.  generation is the list
+        df belongs to (default: the current one); a reset() since then makes
+        the compaction a no-op."""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+            upto = self._last_id
+            if generation is None:
+                generation = self._generation
+        threading.Thread(target=self._compact, args=(df, upto, generation), daemon=True).start()
+
+    def _compact(self, df, upto, generation):
+        try:
+            with self._snapshot_lock:
+                if generation != self._generation:
+                    return  # reset/clear replaced the list after df was taken
+                self._write_snapshot(df)
+            with self._lock:
+                self._db.execute("DELETE FROM events WHERE id <= ?", (upto,))
+                self._db.commit()
+                self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._pending = self._db.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        finally:
+            self._compacting = False
+
+    # ---- campaign resume ----
+    def start_campaign(self, contacts):
+        self.flush()  # outcomes of the last campaign must not mark this one
+        with self._lock:
+            self._db.execute("DELETE FROM campaign")
+            self._db.executemany(
+                "INSERT INTO campaign (pos, number, name, category, attempt, due) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (i, c["number"], c.get("name"), c.get("category"),
+                     c.get("attempt", 1), c.get("due"))
+                    for i, c in enumerate(contacts)
+                ],
+            )
+            self._db.commit()
+
+    def pending_campaign(self):
+        """Contacts of an interrupted campaign still to be dialed, in order.
+
+        Each keeps its "attempt" and, for a pending redial, "due" (wall clock)."""
+        self.flush()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT number, name, category, attempt, due FROM campaign "
+                "WHERE done = 0 ORDER BY pos"
+            ).fetchall()
+        return [
+            {"number": n, "name": nm, "category": c, "attempt": a, **({"due": d} if d else {})}
+            for n, nm, c, a, d in rows
+        ]
+
+    def finish_campaign(self):
+        """Forget the campaign queue once every contact in it was dialed."""
+        self.flush()
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM campaign WHERE NOT EXISTS "
+                "(SELECT 1 FROM campaign WHERE done = 0)"
+            )
+            self._db.commit()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Non-blocking log pipeline.
+
+Any thread may call log(): the message is only put on two queues.  The Tk
+thread drains the UI queue on a timer in batches (drain()), and a
+QueueListener thread writes the file queue to a rotating JSON-lines file, so
+neither dialing nor the UI ever waits for the widget or the disk.
+"""
+
+import json
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = "dialer.jsonl"
+
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(
+            {
+                "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S")
+                + f".{int(record.msecs):03d}",
+                "msg": record.getMessage(),
+            },
+            ensure_ascii=False,
+        )
+
+
+class LogPipeline:
+    def __init__(self, path=LOG_FILE, max_bytes=5 * 1024 * 1024, backups=5, name="dialer"):
+        self._ui = queue.SimpleQueue()
+
+        file_q = queue.SimpleQueue()
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.setFormatter(JsonLineFormatter())
+        self._listener = QueueListener(file_q, handler)
+        self._listener.start()
+
+        self._logger = logging.getLogger(name)
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._logger.handlers[:] = [QueueHandler(file_q)]
+
+    def log(self, msg):
+        """Thread-safe, never blocks."""
+        self._ui.put(f"[{time.strftime('%H:%M:%S')}] {msg}")
+        self._logger.info(msg)
+
+    def drain(self, limit=500):
+        """Up to limit pending UI lines (call from the Tk thread)."""
+        lines = []
+        try:
+            while len(lines) < limit:
+                lines.append(self._ui.get_nowait())
+        except queue.Empty:
+            pass
+        return lines
+
+    def close(self):
+        self._listener.stop()
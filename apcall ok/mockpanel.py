@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the telephony panel, for benchmarks and dry runs.
+
+Serves one page with the provider's structure: a login form (remembered in
+a session cookie, so a persistent browser profile skips it), a dial-pad
+button (.mdi-dialpad), the number field (#dial-field, read from its input
+events like the real single-page app), a call and a hang-up button and the
+.mdi-pause indicator shown while a call is up.  The default selectors of
+settings.DEFAULT_CONFIG (plus hangup_button "button.hangup") match it.
+
+For every call the server draws an outcome and its timings from a profile:
+
+    {"outcomes": {"answered": 0.35, "powered_off_or_busy": 0.4, "no_answer": 0.25},
+     "ring_s": {"dist": "lognormal", "median": 4, "sigma": 0.4},
+     "busy_s": {"dist": "uniform", "low": 0.5, "high": 2.5},
+     "early_hangup_s": {...}, "talk_s": {...}, "login_ms": 300, "seed": null}
+
+Distributions: fixed (value), uniform (low, high), normal (mean, sd),
+lognormal (median, sigma).  Each planned call is kept as ground truth and
+served from GET /api/calls.
+
+The same panel answers the browserless backend (apiclient.py):
+
+    POST /api/login   {"username", "password"} -> {"token"}
+    POST /api/dial    {"number"}, Authorization: Bearer <token>
+    POST /api/hangup  {"number"}, Authorization: Bearer <token>
+    GET  /api/events?token=<token>   WebSocket; the server pushes
+         {"event": "up"|"down", "number"} when the indicator would
+         appear/disappear on the page
+
+    python mockpanel.py --port 8790 [--profile profile.json]
+"""
+
+import argparse
+import base64
+import copy
+import hashlib
+import json
+import math
+import random
+import secrets
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+DEFAULT_PROFILE = {
+    "outcomes": {
+        "answered": 0.35,
+        "ended_after_answer": 0.0,
+        "powered_off_or_busy": 0.4,
+        "no_answer": 0.25,
+    },
+    "ring_s": {"dist": "lognormal", "median": 4.0, "sigma": 0.4},
+    "busy_s": {"dist": "uniform", "low": 0.5, "high": 2.5},
+    "early_hangup_s": {"dist": "uniform", "low": 3.31, "high": 3.38},
+    "talk_s": {"dist": "uniform", "low": 20.0, "high": 40.0},
+    "login_ms": 300,
+    "seed": None,
+}
+
+PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Mock dialer</title></head>
+<body><div id="app"></div>
+<script>
+const LOGIN_MS = %(login_ms)d;
+const app = document.getElementById("app");
+let number = "", indicator = null, timers = [];
+
+function loginView() {
+  app.innerHTML = '<form id="login-form"><input name="login"> ' +
+    '<input name="password" type="password"> <button type="submit">Login</button></form>';
+  document.getElementById("login-form").addEventListener("submit", (e) => {
+    e.preventDefault();
+    app.innerHTML = "...";
+    setTimeout(() => {
+      document.cookie = "mock_session=1; max-age=86400; path=/";
+      panelView();
+    }, LOGIN_MS);
+  });
+}
+
+function panelView() {
+  app.innerHTML = '<button id="dialer-button" class="mdi mdi-dialpad" type="button">Dialer</button>' +
+    '<div id="pad"></div>';
+  document.getElementById("dialer-button").addEventListener("click", padView);
+}
+
+function padView() {
+  number = "";
+  document.getElementById("pad").innerHTML =
+    '<input id="dial-field" name="phone"> ' +
+    '<button class="call-now mdi mdi-phone" type="button">Call</button> ' +
+    '<button class="hangup mdi mdi-phone-hangup" type="button">Hang up</button>';
+  // like a bound v-model: the app only knows what input events told it
+  document.getElementById("dial-field").addEventListener("input", (e) => { number = e.target.value; });
+  document.querySelector(".call-now").addEventListener("click", call);
+  document.querySelector(".hangup").addEventListener("click", () => {
+    endCall();
+    fetch("/api/hangup", {method: "POST", body: JSON.stringify({number: number})});
+  });
+}
+
+function endCall() {
+  timers.forEach(clearTimeout);
+  timers = [];
+  if (indicator) { indicator.remove(); indicator = null; }
+}
+
+function later(ms, fn) { timers.push(setTimeout(fn, Math.max(0, ms))); }
+
+function call() {
+  endCall();
+  const t0 = performance.now();
+  fetch("/api/dial", {method: "POST", body: JSON.stringify({number: number})})
+    .then((r) => r.json())
+    .then((plan) => {
+      const lag = performance.now() - t0;
+      if (plan.appear_ms === null) return;  // rings out, never picked up
+      later(plan.appear_ms - lag, () => {
+        indicator = document.createElement("i");
+        indicator.className = "mdi mdi-pause";
+        document.getElementById("pad").appendChild(indicator);
+      });
+      later(plan.appear_ms + plan.hold_ms - lag, endCall);
+    });
+}
+
+if (document.cookie.includes("mock_session=1")) panelView(); else loginView();
+</script></body></html>
+"""
+
+
+class WsConn:
+    """Server side of one WebSocket: text frames out, close/ping handled in."""
+
+    def __init__(self, rfile, wfile):
+        self.rfile = rfile
+        self.wfile = wfile
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def send(self, obj):
+        data = json.dumps(obj).encode("utf-8")
+        self._frame(0x1, data)
+
+    def _frame(self, opcode, data):
+        n = len(data)
+        if n < 126:
+            head = struct.pack("!BB", 0x80 | opcode, n)
+        elif n < 1 << 16:
+            head = struct.pack("!BBH", 0x80 | opcode, 126, n)
+        else:
+            head = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+        with self._lock:
+            if self.closed:
+                return
+            try:
+                self.wfile.write(head + data)
+                self.wfile.flush()
+            except OSError:
+                self.closed = True
+
+    def serve(self):
+        """Read client frames until it closes (client frames are masked)."""
+        try:
+            while True:
+                b1, b2 = self.rfile.read(2)
+                n = b2 & 0x7F
+                if n == 126:
+                    n = struct.unpack("!H", self.rfile.read(2))[0]
+                elif n == 127:
+                    n = struct.unpack("!Q", self.rfile.read(8))[0]
+                mask = self.rfile.read(4) if b2 & 0x80 else b"\0\0\0\0"
+                data = bytes(c ^ mask[i % 4] for i, c in enumerate(self.rfile.read(n)))
+                opcode = b1 & 0x0F
+                if opcode == 0x8:
+                    self._frame(0x8, data[:2])
+                    break
+                if opcode == 0x9:
+                    self._frame(0xA, data)
+        except (ValueError, OSError):
+            pass  # connection dropped
+        self.closed = True
+
+
+def sample(spec, rng):
+    """One draw (seconds) from a distribution spec."""
+    kind = spec.get("dist", "fixed")
+    if kind == "fixed":
+        return float(spec["value"])
+    if kind == "uniform":
+        return rng.uniform(spec["low"], spec["high"])
+    if kind == "normal":
+        return max(0.0, rng.gauss(spec["mean"], spec["sd"]))
+    if kind == "lognormal":
+        return spec["median"] * math.exp(rng.gauss(0.0, spec["sigma"]))
+    raise ValueError(f"unknown distribution: {kind}")
+
+
+class MockPanel:
+    def __init__(self, profile=None):
+        self.profile = copy.deepcopy(DEFAULT_PROFILE)
+        self.profile.update(profile or {})
+        self.rng = random.Random(self.profile["seed"])
+        self._lock = threading.Lock()
+        self.calls = []  # ground truth, one dict per dial
+        self.tokens = {}  # API token -> {"ws": WsConn or None, "timers": [...]}
+        self.page = (PAGE % {"login_ms": self.profile["login_ms"]}).encode("utf-8")
+
+    def plan(self, number):
+        p = self.profile
+        with self._lock:
+            outcomes, weights = zip(*p["outcomes"].items())
+            outcome = self.rng.choices(outcomes, weights)[0]
+            ring = sample(p["ring_s"], self.rng)
+            hold = {
+                "answered": p["talk_s"],
+                "ended_after_answer": p["early_hangup_s"],
+                "powered_off_or_busy": p["busy_s"],
+            }.get(outcome)
+            call = {
+                "number": number,
+                "outcome": outcome,
+                "dialed_at": time.time(),
+                "ring_s": None if outcome == "no_answer" else ring,
+                "hold_s": None if hold is None else sample(hold, self.rng),
+                "hangup_at": None,
+            }
+            self.calls.append(call)
+        return {
+            "appear_ms": None if call["ring_s"] is None else call["ring_s"] * 1000,
+            "hold_ms": None if call["hold_s"] is None else call["hold_s"] * 1000,
+        }
+
+    def hangup(self, number):
+        with self._lock:
+            for call in reversed(self.calls):
+                if call["number"] == number:
+                    call["hangup_at"] = call["hangup_at"] or time.time()
+                    break
+
+    def login(self, username):
+        token = secrets.token_hex(16)
+        with self._lock:
+            self.tokens[token] = {"user": username, "ws": None, "timers": []}
+        return token
+
+    def api_dial(self, token, number):
+        """plan() a call and push its up/down events to the token's WebSocket."""
+        line = self.tokens[token]
+        self._cancel(line)
+        plan = self.plan(number)
+        if plan["appear_ms"] is not None:
+            up = plan["appear_ms"] / 1000
+            self._later(line, up, {"event": "up", "number": number})
+            self._later(line, up + plan["hold_ms"] / 1000, {"event": "down", "number": number})
+        return plan
+
+    def api_hangup(self, token, number):
+        line = self.tokens[token]
+        self._cancel(line)
+        ws = line["ws"]
+        if ws is not None:
+            ws.send({"event": "down", "number": number})
+        self.hangup(number)
+
+    def _later(self, line, secs, event):
+        def push():
+            ws = line["ws"]
+            if ws is not None:
+                ws.send(event)
+        t = threading.Timer(secs, push)
+        t.daemon = True
+        line["timers"].append(t)
+        t.start()
+
+    @staticmethod
+    def _cancel(line):
+        for t in line["timers"]:
+            t.cancel()
+        line["timers"] = []
+
+    def truth(self):
+        with self._lock:
+            return [dict(c) for c in self.calls]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    panel = None  # set on the server-specific subclass
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, body, ctype="application/json"):
+        self.send_response(200)
+        self.send_header("Content-Type", f"{ctype}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _token(self):
+        auth = self.headers.get("Authorization") or ""
+        token = auth[7:] if auth.startswith("Bearer ") else None
+        return token if token in self.panel.tokens else None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/api/calls":
+            self._send(json.dumps(self.panel.truth()).encode("utf-8"))
+        elif url.path == "/api/events":
+            self._websocket(parse_qs(url.query).get("token", [""])[0])
+        else:
+            self._send(self.panel.page, "text/html")
+
+    def _websocket(self, token):
+        line = self.panel.tokens.get(token)
+        key = self.headers.get("Sec-WebSocket-Key")
+        if line is None or not key:
+            self.send_error(401 if line is None else 400)
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+        ws = line["ws"] = WsConn(self.rfile, self.wfile)
+        ws.serve()
+        if line["ws"] is ws:
+            line["ws"] = None
+        self.close_connection = True
+
+    def do_POST(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(n) or b"{}")
+        token = self._token()
+        if self.path == "/api/login":
+            self._send(json.dumps({"token": self.panel.login(body.get("username"))}).encode("utf-8"))
+        elif self.path == "/api/dial":
+            number = body.get("number", "")
+            plan = self.panel.api_dial(token, number) if token else self.panel.plan(number)
+            self._send(json.dumps(plan).encode("utf-8"))
+        elif self.path == "/api/hangup":
+            if token:
+                self.panel.api_hangup(token, body.get("number", ""))
+            else:
+                self.panel.hangup(body.get("number", ""))
+            self._send(b"{}")
+        else:
+            self.send_error(404)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # dozens of API lines connect at once
+
+
+def serve_mock(panel, host="127.0.0.1", port=8790):
+    """Start the mock panel on a background thread; returns the server."""
+    handler = type("Handler", (MockHandler,), {"panel": panel})
+    server = MockServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Mock telephony panel")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8790)
+    ap.add_argument("--profile", help="JSON file overriding DEFAULT_PROFILE")
+    args = ap.parse_args()
+
+    profile = None
+    if args.profile:
+        with open(args.profile, encoding="utf-8") as f:
+            profile = json.load(f)
+    server = serve_mock(MockPanel(profile), args.host, args.port)
+    print(f"mock panel on http://{args.host}:{args.port}/")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Scripted checks that need neither Firefox nor a sound card.
+
+    python selfcheck.py            # every check
+    python selfcheck.py api        # only the named ones
+
+vad       every fixtures/<verdict>[_what].wav gets <verdict> from vad.classify,
+          and every verdict has a fixture
+outcomes  every call status survives ContactStore.mark -> to_frame -> a
+          journal snapshot -> ContactStore again
+answer    the answer check judges a voicemail when the line monitor was open
+          before the answer, and is skipped (logged) when the monitor only
+          started after answered_at
+numbers   the import normalizer keeps the number forms Excel and people
+          write, and rejects (and counts) cells it cannot trust – foreign
+          or landline numbers and scientific notation that lost digits
+api       ApiSession against mockpanel on a free local port: one call per
+          outcome, each forced by the panel profile, must be classified
+          as that outcome.
+
+Exits 1 when a check fails.
+"""
+
+import copy
+import glob
+import os
+import sys
+import tempfile
+import traceback
+
+from settings import DEFAULT_CONFIG
+
+DETECT = {"ring_timeout": 0.5, "off_busy_threshold": 0.3, "answered_grace": 0.6}
+
+# fixed timings that put each outcome well clear of the DETECT thresholds
+API_PROFILE = {
+    "ring_s": {"dist": "fixed", "value": 0.1},
+    "busy_s": {"dist": "fixed", "value": 0.1},
+    "early_hangup_s": {"dist": "fixed", "value": 0.75},
+    "talk_s": {"dist": "fixed", "value": 5.0},
+    "login_ms": 0,
+}
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def check_vad():
+    from vad import VERDICTS, classify_wav
+
+    seen = set()
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.wav"))):
+        expected = os.path.basename(path)[:-4].split("_")[0]
+        got = classify_wav(path)["verdict"]
+        assert got == expected, f"{os.path.basename(path)}: got {got}"
+        seen.add(expected)
+    missing = set(VERDICTS) - seen
+    assert not missing, f"no fixture for {sorted(missing)}"
+
+
+def check_outcomes():
+    from contacts import CAT_COL, NAME_COL, OUTCOMES, PHONE_COL, ContactStore
+    from journal import ContactJournal
+    import pandas as pd
+
+    statuses = ["answered", "ended_after_answer", *DEFAULT_CONFIG["redial"]["backoff"]]
+    missing = [s for s in statuses if s not in OUTCOMES]
+    assert not missing, f"no outcome code for {missing}"
+
+    phones = [f"0990000{i:04d}" for i in range(len(statuses))]
+    store = ContactStore(pd.DataFrame({NAME_COL: phones, CAT_COL: "x", PHONE_COL: phones}))
+    for phone, status in zip(phones, statuses):
+        store.mark(phone, status, 1.0)
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as d:  # db stays open
+        journal = ContactJournal(os.path.join(d, "contacts.pkl"), os.path.join(d, "journal.db"))
+        journal.reset(store.to_frame())
+        reloaded = ContactStore(journal.load())
+    got = reloaded.to_frame().set_index(PHONE_COL)["Outcome"]
+    for phone, status in zip(phones, statuses):
+        assert got[phone] == status, f"{status}: got {got[phone]!r}"
+
+
+def check_answer():
+    import numpy as np
+
+    import audio
+    from backends import DialerBackend
+    from vad import read_wav
+
+    samples, rate = read_wav(os.path.join(FIXTURES, "voicemail.wav"))
+    cfg = copy.deepcopy(DEFAULT_CONFIG)
+    cfg["audio"].update(input_index=0, detect_answer=True, sample_rate=rate)
+    logs = []
+    session = DialerBackend(cfg, logs.append)
+    answered_at = 1000.0
+
+    def judge(opened_at):
+        """_check_answer on a line whose monitor started capturing at opened_at."""
+        line = np.concatenate([np.zeros(int(2 * rate), dtype=np.int16), samples])
+        t0 = answered_at - 2  # line time of line[0]
+        buf = audio.LineBuffer(rate)
+        for i in range(max(0, int((opened_at - t0) * rate)), len(line), 256):
+            chunk = line[i:i + 256]
+            buf.feed(chunk, t0 + (i + len(chunk)) / rate)
+        audio._monitors[0] = buf
+        out = {"status": "answered", "duration": 2.0, "decided_at": answered_at + 2.0}
+        session._check_answer(out)
+        return out
+
+    try:
+        out = judge(opened_at=answered_at - 2)  # opened at login / campaign start
+        assert out["status"] == "voicemail", f"monitor open before the answer: got {out}"
+        logs.clear()
+        out = judge(opened_at=answered_at + 1)  # created after answered_at
+        assert out["status"] == "answered" and "answer" not in out, \
+            f"monitor opened after the answer was judged: got {out}"
+        assert logs, "skipped check was not logged"
+    finally:
+        audio._monitors.pop(0, None)
+
+
+def check_numbers():
+    from importer import _finish_chunk
+    from contacts import PHONE_COL
+    import pandas as pd
+
+    cells = {
+        "9.123456789E+09": "09123456789",
+        "9.89123456789e11": "09123456789",
+        "9123456789.0": "09123456789",
+        "+98 912 345 6789": "09123456789",
+        "۰۹۱۲۳۴۵۶۷۸۹": "09123456789",
+        "9.12346E+09": None,  # Excel rounded away the last digits
+        "9.12345678E+09": None,
+        "+1 212 555 0100": None,
+        "02112345678": None,
+    }
+    kept = _finish_chunk(pd.DataFrame({PHONE_COL: list(cells)}))
+    want = [v for v in cells.values() if v]
+    assert kept[PHONE_COL].tolist() == want, f"kept {kept[PHONE_COL].tolist()}"
+    assert kept.attrs["rejected"] == len(cells) - len(want), f"rejected {kept.attrs['rejected']}"
+
+
+def check_api():
+    from apiclient import ApiSession
+    from mockpanel import MockPanel, serve_mock
+
+    panel = MockPanel(API_PROFILE)
+    server = serve_mock(panel, port=0)
+    cfg = copy.deepcopy(DEFAULT_CONFIG)
+    cfg.update(backend="api", site_url=f"http://127.0.0.1:{server.server_address[1]}/",
+               username="agent0", password="secret", detect=dict(DETECT))
+    session = ApiSession(cfg, lambda msg: None)
+    try:
+        session.login()
+        assert session.is_ready(), "not ready after login"
+        for i, outcome in enumerate(("answered", "ended_after_answer",
+                                     "powered_off_or_busy", "no_answer")):
+            panel.profile["outcomes"] = {outcome: 1.0}
+            session.dial(f"0990000000{i}")
+            got = session.wait_for_outcome()
+            assert got["status"] == outcome, f"{outcome}: got {got['status']}"
+            if session.call_up():
+                session.hangup()
+            session.wait_idle()
+    finally:
+        session.quit()
+        server.shutdown()
+
+
+CHECKS = {"vad": check_vad, "outcomes": check_outcomes, "answer": check_answer,
+          "numbers": check_numbers, "api": check_api}
+
+
+def main():
+    names = sys.argv[1:] or list(CHECKS)
+    unknown = [n for n in names if n not in CHECKS]
+    if unknown:
+        sys.exit(f"unknown checks: {', '.join(unknown)} (have {', '.join(CHECKS)})")
+    failed = 0
+    for name in names:
+        try:
+            CHECKS[name]()
+            print(f"ok    {name}")
+        except Exception:
+            failed += 1
+            print(f"FAIL  {name}")
+            traceback.print_exc()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Dialer sessions – one Firefox driver logged in with one agent account (the
+"selenium" backend, see backends.py).
+Each session carries its own credentials/selectors (top-level config merged
+with an entry of config["sessions"]) so several lines can dial in parallel.
+SessionPool keeps those drivers logged in between campaigns/manual calls and
+only replays the login form when a health check finds the session dead.
+Call progress is watched inside the page with a MutationObserver, so the
+pause-indicator timings come back in one async-script round-trip.  Dialing is
+one round-trip too: the dial-pad elements are resolved once, cached, and
+filled and pressed by a single injected script.
+
+With config["browser"]["profile_dir"] set, each session runs Firefox on its
+own persistent profile (<profile_dir>/<session name>), keeping cookies and
+the HTTP cache between runs; login() then finds the panel already signed in
+and only opens the dial pad.  config["browser"]["lite"] turns off images,
+web fonts and prefetching, which the dialer never looks at.  With
+config["browser"]["shared"] all lines run as tabs of one Firefox instead
+(sharedbrowser.py).
+"""
+
+import copy
+import os
+import threading
+import time
+
+from selenium import webdriver
+from selenium.common.exceptions import StaleElementReferenceException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.firefox.options import Options
+
+from backends import DialerBackend, make_session
+from metrics import METRICS
+from tracing import span
+
+
+# arguments: pause selector, ring timeout (ms), answer threshold (ms), callback.
+# Resolves with performance.now() offsets of the indicator appearing and of
+# the watch ending, plus whether it ended because the indicator disappeared.
+PAUSE_WATCH_JS = """
+const [sel, ringMs, answerMs, done] = arguments;
+const t0 = performance.now();
+let appeared = null, finished = false, timer = null, obs = null;
+const finish = (gone) => {
+  if (finished) return;
+  finished = true;
+  if (obs) obs.disconnect();
+  clearTimeout(timer);
+  done({appeared: appeared === null ? null : appeared - t0,
+        ended: performance.now() - t0, gone: gone});
+};
+const check = () => {
+  const present = document.querySelector(sel) !== null;
+  if (appeared === null) {
+    if (present) {
+      appeared = performance.now();
+      clearTimeout(timer);
+      timer = setTimeout(() => finish(false), answerMs);
+    }
+  } else if (!present) {
+    finish(true);
+  }
+};
+timer = setTimeout(() => finish(false), ringMs);
+obs = new MutationObserver(check);
+obs.observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+check();
+"""
+
+# arguments: phone input, call button, number, callback.  Sets the value the
+# way a user edit would (native setter + input/change events, so bound
+# single-page-app models see it) and presses call, waiting a few ticks if the
+# app keeps the button disabled until it has re-rendered.  Resolves false if
+# either element has been detached from the page.
+DIAL_JS = """
+const [inp, btn, number, done] = arguments;
+if (!inp.isConnected || !btn.isConnected) { done(false); return; }
+const setValue = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, "value").set;
+inp.focus();
+setValue.call(inp, number);
+inp.dispatchEvent(new Event("input", {bubbles: true}));
+inp.dispatchEvent(new Event("change", {bubbles: true}));
+const press = (tries) => {
+  if (btn.disabled && tries > 0) { setTimeout(() => press(tries - 1), 10); return; }
+  btn.click();
+  done(true);
+};
+press(20);
+"""
+
+
+# assets the dialer never looks at; the panel's DOM is all it reads
+LITE_PREFS = {
+    "permissions.default.image": 2,
+    "browser.display.use_document_fonts": 0,
+    "gfx.downloadable_fonts.enabled": False,
+    "network.prefetch-next": False,
+    "network.dns.disablePrefetch": True,
+    "network.http.speculative-parallel-limit": 0,
+    "browser.sessionhistory.max_total_viewers": 0,
+    "media.autoplay.default": 5,
+}
+
+
+def firefox_options(config, headless, profile=None):
+    """Options shared by per-line and shared browsers."""
+    opts = Options()
+    if headless:
+        opts.add_argument("--headless")
+    opts.set_preference("permissions.default.microphone", 1)
+    opts.set_preference("media.navigator.permission.disabled", True)
+    if (config.get("browser") or {}).get("lite"):
+        for name, value in LITE_PREFS.items():
+            opts.set_preference(name, value)
+    if profile:
+        # used in place (not copied to a temp dir like options.profile)
+        os.makedirs(profile, exist_ok=True)
+        opts.add_argument("-profile")
+        opts.add_argument(profile)
+        opts.set_preference("browser.sessionstore.resume_from_crash", False)
+        opts.set_preference("browser.shell.checkDefaultBrowser", False)
+    return opts
+
+
+def profile_dir(config, name):
+    """<profile_dir>/<name> as an absolute path, None without profile_dir."""
+    root = (config.get("browser") or {}).get("profile_dir")
+    if not root:
+        return None
+    name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name or "default")
+    return os.path.abspath(os.path.join(root, name))
+
+
+def deep_merge(base, override):
+    merged = {}
+    for k, v in base.items():
+        if k in override and isinstance(v, dict):
+            merged[k] = deep_merge(v, override[k])
+        elif k in override:
+            merged[k] = override[k]
+        else:
+            merged[k] = v
+    for k in override:
+        if k not in merged:
+            merged[k] = override[k]
+    return merged
+
+
+def session_configs(config):
+    """Expand config["sessions"] into full per-account configs (at least one)."""
+    base = {k: copy.deepcopy(v) for k, v in config.items() if k != "sessions"}
+    entries = config.get("sessions") or [{}]
+    out = []
+    for i, entry in enumerate(entries, start=1):
+        cfg = deep_merge(base, copy.deepcopy(entry))
+        cfg["name"] = entry.get("name") or cfg.get("username") or f"line{i}"
+        out.append(cfg)
+    return out
+
+
+class DialerSession(DialerBackend):
+    def __init__(self, config, log, headless=True):
+        super().__init__(config, log, headless)
+        self.driver = None
+        self._script_timeout = None
+        self._elements = {}  # selector -> WebElement, dropped when stale
+
+    def _init_firefox_driver(self):
+        opts = firefox_options(self.config, self.headless, profile_dir(self.config, self.name))
+        return webdriver.Firefox(options=opts)
+
+    def _driver_alive(self) -> bool:
+        if not self.driver:
+            return False
+        try:
+            self.driver.current_url
+            return True
+        except:
+            return False
+
+    def _login(self):
+        if not self._driver_alive():
+            self.quit()
+            self.driver = self._init_firefox_driver()
+            self._script_timeout = None
+        self._elements.clear()
+        self.driver.get(self.config["site_url"])
+
+        sel = self.config["selectors"]
+        # a saved profile may still hold a valid session: then the panel
+        # comes up instead of the login form
+        WebDriverWait(self.driver, 5).until(EC.any_of(  # Reduced from 10s
+            EC.presence_of_element_located((By.CSS_SELECTOR, sel["username"])),
+            EC.presence_of_element_located((By.CSS_SELECTOR, sel["dialer_button"])),
+        ))
+        if self._is_present(sel["dialer_button"]):
+            self.log("🍪 نشست قبلی هنوز معتبر است؛ بدون فرم ورود.")
+        else:
+            self.driver.find_element(By.CSS_SELECTOR, sel["username"]).send_keys(
+                self.config["username"]
+            )
+            self.driver.find_element(By.CSS_SELECTOR, sel["password"]).send_keys(
+                self.config["password"]
+            )
+            self.driver.find_element(By.CSS_SELECTOR, sel["login_button"]).click()
+
+        WebDriverWait(self.driver, 5).until(  # Reduced from 10s
+            EC.element_to_be_clickable((By.CSS_SELECTOR, sel["dialer_button"]))
+        )
+        self.driver.find_element(By.CSS_SELECTOR, sel["dialer_button"]).click()
+        # the pad is ready once its input exists; was a fixed 1s sleep
+        WebDriverWait(self.driver, 5).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, sel["phone_input"]))
+        )
+
+    def is_ready(self) -> bool:
+        """Health check: browser alive, logged in and dial pad open."""
+        if not self._driver_alive():
+            return False
+        sel = self.config["selectors"]
+        if self._is_present(sel["phone_input"]):
+            return True
+        if not self._is_present(sel["dialer_button"]):
+            return False
+        try:
+            self.driver.find_element(By.CSS_SELECTOR, sel["dialer_button"]).click()
+            WebDriverWait(self.driver, 2).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, sel["phone_input"]))
+            )
+            return True
+        except:
+            return False
+
+    def quit(self):
+        if self.driver:
+            try:
+                self.driver.quit()
+            except:
+                pass
+            self.driver = None
+        self._elements.clear()
+
+    def _is_present(self, sel) -> bool:
+        try:
+            return len(self.driver.find_elements(By.CSS_SELECTOR, sel)) > 0
+        except:
+            return False
+
+    def _element(self, sel):
+        el = self._elements.get(sel)
+        if el is None:
+            el = self._elements[sel] = self.driver.find_element(By.CSS_SELECTOR, sel)
+        return el
+
+    def dial(self, number):
+        """Fill the number and press call in one script round-trip."""
+        sel = self.config["selectors"]
+        for attempt in range(2):
+            try:
+                inp = self._element(sel["phone_input"])
+                btn = self._element(sel["call_button"])
+                self.dialed_at = time.time()
+                if self.driver.execute_async_script(DIAL_JS, inp, btn, number):
+                    METRICS.observe("dial", time.time() - self.dialed_at)
+                    return
+            except StaleElementReferenceException:
+                if attempt:
+                    raise
+            # the dial pad was re-rendered: resolve the elements again
+            self._elements.clear()
+        raise WebDriverException("dial pad elements keep going stale")
+
+    def _watch_outcome(self):
+        ring_timeout, off_busy_threshold, answered_grace = self._detect_params()
+        sel = self.config["selectors"]["pause_indicator"]
+
+        timeout = ring_timeout + off_busy_threshold + answered_grace + 5
+        try:
+            if self._script_timeout != timeout:
+                self.driver.set_script_timeout(timeout)
+                self._script_timeout = timeout
+            res = self.driver.execute_async_script(
+                PAUSE_WATCH_JS, sel,
+                ring_timeout * 1000, (off_busy_threshold + answered_grace) * 1000,
+            )
+        except WebDriverException as e:
+            self.log(f"⚠️ ناظر صفحه در دسترس نیست ({e.msg}); بررسی دوره‌ای...")
+            return self._poll_outcome()
+        return self._watch_result(res)
+
+    def _watch_result(self, res):
+        """Outcome from the timings PAUSE_WATCH_JS resolved with."""
+        if res["appeared"] is None:
+            METRICS.observe("ring", res["ended"] / 1000)
+            self.log("🕔 تماس بی‌پاسخ/خارج‌دسترس.")
+            return {"status": "no_answer", "duration": 0.0}
+        METRICS.observe("ring", res["appeared"] / 1000)
+        METRICS.observe("detect", (res["ended"] - res["appeared"]) / 1000)
+        self.log(f"⏳ نشانگر تماس ظاهر شد ({res['appeared'] / 1000:.2f}s پس از شماره‌گیری).")
+        return self._classify((res["ended"] - res["appeared"]) / 1000, res["gone"])
+
+    def _poll_outcome(self):
+        """Fallback when scripts can't run: poll the indicator every 200 ms."""
+        with span("poll_outcome", session=self.name):
+            return self._poll_loop()
+
+    def _poll_loop(self):
+        ring_timeout, off_busy_threshold, answered_grace = self._detect_params()
+        sel = self.config["selectors"]["pause_indicator"]
+
+        start = time.monotonic()
+        deadline = start + ring_timeout
+        while time.monotonic() < deadline:
+            if self._is_present(sel):
+                t0 = time.monotonic()
+                self.log("⏳ نشانگر تماس ظاهر شد.")
+                break
+            time.sleep(0.2)
+        else:
+            METRICS.observe("ring", time.monotonic() - start)
+            self.log("🕔 تماس بی‌پاسخ/خارج‌دسترس.")
+            return {"status": "no_answer", "duration": 0.0}
+        METRICS.observe("ring", t0 - start)
+
+        while True:
+            elapsed = time.monotonic() - t0
+            gone = not self._is_present(sel)
+            if gone or elapsed >= off_busy_threshold + answered_grace:
+                METRICS.observe("detect", elapsed)
+                return self._classify(elapsed, gone)
+            time.sleep(0.2)
+
+    def call_up(self) -> bool:
+        """True while the pause indicator shows the call is connected."""
+        return self._is_present(self.config["selectors"]["pause_indicator"])
+
+    def wait_idle(self, timeout=3.0):
+        """Wait until the page has torn the last call down (indicator gone)."""
+        sel = self.config["selectors"]["pause_indicator"]
+        deadline = time.monotonic() + timeout
+        with span("wait_idle", session=self.name):
+            while self._is_present(sel) and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+    def hangup(self):
+        sel = self.config["selectors"]["hangup_button"]
+        try:
+            if sel and self.driver:
+                self.driver.find_element(By.CSS_SELECTOR, sel).click()
+        finally:
+            self.hangup_event.set()
+
+
+def _login_key(cfg):
+    return (cfg.get("backend"), cfg["site_url"], cfg["username"], cfg["password"],
+            cfg["selectors"], cfg.get("browser"), cfg.get("api"))
+
+
+class SessionPool:
+    def __init__(self, config, log, headless=True):
+        self.log = log
+        self.headless = headless
+        self._lock = threading.Lock()
+        self._sessions = {}  # name -> DialerSession
+        self._busy = set()
+        self.configure(config)
+
+    def configure(self, config):
+        """Apply a (re)saved config; sessions whose login details changed are retired."""
+        with self._lock:
+            fresh = {}
+            for cfg in session_configs(config):
+                old = self._sessions.pop(cfg["name"], None)
+                if old and _login_key(old.config) == _login_key(cfg):
+                    old.config = cfg
+                    fresh[cfg["name"]] = old
+                else:
+                    fresh[cfg["name"]] = make_session(cfg, self.log, self.headless)
+                    if old and old not in self._busy:
+                        old.quit()
+            for old in self._sessions.values():
+                if old not in self._busy:
+                    old.quit()
+            self._sessions = fresh
+
+            multi = len(fresh) > 1
+            for s in fresh.values():
+                s.label = s.name if multi else ""
+
+    @property
+    def sessions(self):
+        """Every live session, including retired ones still in a call."""
+        with self._lock:
+            return list(self._sessions.values()) + [
+                s for s in self._busy if s not in self._sessions.values()
+            ]
+
+    def acquire(self, name=None):
+        """Reserve an idle session (optionally by name); None if all are busy."""
+        with self._lock:
+            for s in self._sessions.values():
+                if s not in self._busy and name in (None, s.name):
+                    self._busy.add(s)
+                    return s
+        return None
+
+    def acquire_all(self):
+        with self._lock:
+            idle = [s for s in self._sessions.values() if s not in self._busy]
+            self._busy.update(idle)
+        return idle
+
+    def release(self, session):
+        with self._lock:
+            self._busy.discard(session)
+            retired = session not in self._sessions.values()
+        if retired:
+            session.quit()
+
+    def close(self):
+        for s in self.sessions:
+            s.quit()
+        with self._lock:
+            self._sessions = {}
+            self._busy.clear()
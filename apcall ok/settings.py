@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Dialer configuration: defaults and loading of config.json, shared by the Tk
+app and the headless daemon.
+"""
+
+import copy
+import json
+import os
+
+from sessions import deep_merge
+
+CONFIG_FILE = "config.json"
+
+DEFAULT_CONFIG = {
+    "site_url": "",
+    "username": "",
+    "password": "",
+    "selectors": {
+        "username": "input[name=\"login\"]",
+        "password": "input[name=\"password\"]",
+        "login_button": "button[type=\"submit\"]",
+        "dialer_button": "button#dialer-button",
+        "phone_input": "input[name=\"phone\"]",
+        "call_button": "button.call-now",
+        "hangup_button": "",
+        "pause_indicator": ".mdi-pause"
+    },
+    "schedule": {
+        "start": "09:00",
+        "end": "18:00",
+        # optional: several windows replacing start/end, and
+        # per-category windows, e.g. {"VIP": [["10:00", "20:00"]]}
+        "windows": [],
+        "categories": {}
+    },
+    "audio": {
+        "repeat": 1,
+        "delay": 5,
+        "output_index": None,
+        # line audio input (audio.input_devices()); with detect_answer on,
+        # answers are checked for voicemail/announcements (vad.py) before playing
+        "input_index": None,
+        "detect_answer": False,
+        "answer_window": 3.0,  # seconds after the answer; keep <= off_busy_threshold + answered_grace
+        "voicemail_s": 2.5,  # an unbroken voice run this long is a recorded greeting
+        "sample_rate": 8000,  # decoded PCM is mono 16-bit at this rate
+        "cache_mb": 64
+    },
+    "audio_files": [],
+    "audio_current_index": 0,
+    "detect": {
+        "ring_timeout": 15,  # Reduced from 25s
+        "off_busy_threshold": 3.0,
+        "answered_grace": 0.4
+    },
+    # per-outcome redial backoff in seconds (grows by factor per attempt);
+    # outcomes not listed (or set to null) are never redialed
+    "redial": {
+        "max_attempts": 3,
+        "backoff": {
+            "powered_off_or_busy": 300,
+            "no_answer": 900,
+            "voicemail": 900,
+            "announcement": 300
+        },
+        "factor": 2.0
+    },
+    # do-not-call index (see dnc.py); bloom puts a Bloom filter in front
+    "dnc": {
+        "file": "dnc.npy",
+        "bloom": False
+    },
+    # "selenium" drives the panel page in Firefox, "api" uses the panel's
+    # HTTP/WebSocket API without a browser (apiclient.py, paths in "api")
+    "backend": "selenium",
+    "api": {
+        "base_url": "",
+        "login_path": "/api/login",
+        "dial_path": "/api/dial",
+        "hangup_path": "/api/hangup",
+        "events_path": "/api/events",
+        "timeout": 10
+    },
+    # Firefox: profile_dir keeps one persistent profile per session under
+    # this directory (cookies, cache), so restarts skip the login form;
+    # lite turns off images/fonts/prefetch; shared runs every line as a tab
+    # of one browser (sharedbrowser.py, always lite)
+    "browser": {
+        "profile_dir": "",
+        "lite": False,
+        "shared": False
+    },
+    # Prometheus /metrics of the Tk app (metrics.py); port 0 turns it off.
+    # daemon.py serves /metrics on its API port instead
+    "metrics": {
+        "host": "127.0.0.1",
+        "port": 9464
+    },
+    # Chrome trace-event file of WebDriver calls and loop waits (tracing.py);
+    # empty = off
+    "trace": {
+        "file": ""
+    },
+    # extra agent accounts dialing in parallel; each entry may override
+    # name/username/password/selectors, empty = single top-level account
+    "sessions": []
+}
+
+
+def load_config(path=CONFIG_FILE):
+    """config.json merged over the defaults; writes the defaults if missing."""
+    default = copy.deepcopy(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return deep_merge(default, json.load(f))
+    save_config(default, path)
+    return default
+
+
+def save_config(config, path=CONFIG_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Several agent accounts in one Firefox process (config["browser"]["shared"]).
+
+Each line gets its own tab in its own WebDriver BiDi user context, which
+has a separate cookie jar and storage like a Firefox container, so the
+accounts stay logged in independently.  Without BiDi support the tabs fall
+back to one shared cookie jar, which is only safe for a single account.
+
+Classic WebDriver commands go to the focused tab, so every command of a
+line runs under the browser's lock after switching to that line's tab.
+Nothing may hold the lock for a whole call: the pause watcher is started
+with execute_script, records its timings in the page, and is polled every
+POLL_SECS.  The timings are the same page timestamps the per-line watcher
+uses, so outcomes are decided the same way.  Decisions just come up to
+POLL_SECS later.
+
+Background tabs would have their timers throttled, and Fission would start
+a content process per tab.  Both are turned off here, and the "lite" prefs
+(no images, web fonts or prefetching) are always on.  User contexts are
+ephemeral, so a persistent profile_dir keeps the HTTP cache but not the
+per-account logins.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+from sessions import LITE_PREFS, PAUSE_WATCH_JS, DialerSession, firefox_options, profile_dir
+from tracing import span
+
+POLL_SECS = 0.05
+
+SHARED_PREFS = {
+    "fission.autostart": False,
+    "dom.ipc.processCount": 1,
+    "dom.ipc.processCount.webIsolated": 1,
+    "dom.min_background_timeout_value": 4,
+    "dom.min_background_timeout_value_without_budget_throttling": 4,
+    "dom.timeout.enable_budget_throttling": False,
+    "dom.timeout.throttling_delay": 0,
+    "browser.tabs.remote.warmup.enabled": False,
+}
+
+# PAUSE_WATCH_JS with its result stored on the window instead of returned
+WATCH_START_JS = (
+    "window.__dialerWatch = null;\n(function () {\n" + PAUSE_WATCH_JS + "\n}).apply(null, "
+    "[arguments[0], arguments[1], arguments[2], (r) => { window.__dialerWatch = r; }]);"
+)
+WATCH_POLL_JS = "return window.__dialerWatch;"
+
+
+class SharedBrowser:
+    def __init__(self, config, headless=True):
+        self.config = config
+        self.headless = headless
+        self.lock = threading.RLock()
+        self.driver = None
+        self.tabs = {}  # window handle -> BiDi user context (None without BiDi)
+        self._focused = None
+        self.isolated = True
+
+    def _start(self):
+        opts = firefox_options(self.config, self.headless, profile_dir(self.config, "shared"))
+        for name, value in {**LITE_PREFS, **SHARED_PREFS}.items():
+            opts.set_preference(name, value)
+        opts.enable_bidi = True
+        self.driver = webdriver.Firefox(options=opts)
+        self.tabs.clear()
+        self._focused = self.driver.current_window_handle  # the first tab stays blank
+
+    def alive(self) -> bool:
+        if self.driver is None:
+            return False
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def open_tab(self):
+        """A new tab in a fresh user context; starts the browser if needed."""
+        with self.lock:
+            if not self.alive():
+                self.quit()
+                self._start()
+            try:
+                ctx = self.driver.browser.create_user_context()
+                handle = self.driver.browsing_context.create(type="tab", user_context=ctx)
+            except Exception:
+                ctx = None
+                self.isolated = False
+                self.driver.switch_to.new_window("tab")
+                handle = self.driver.current_window_handle
+            self.tabs[handle] = ctx
+            self._focused = None
+            return handle
+
+    def close_tab(self, handle):
+        with self.lock:
+            ctx = self.tabs.pop(handle, None)
+            if self.driver is None:
+                return
+            try:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+                if ctx is not None:
+                    self.driver.browser.remove_user_context(ctx)
+            except Exception:
+                pass
+            self._focused = None
+            if not self.tabs:
+                self.quit()
+
+    @contextmanager
+    def focus(self, handle):
+        """Hold the browser and point classic commands at handle's tab."""
+        with self.lock:
+            if handle is not None and handle != self._focused:
+                self.driver.switch_to.window(handle)
+                self._focused = handle
+            yield self.driver
+
+    def quit(self):
+        with self.lock:
+            if self.driver is not None:
+                try:
+                    self.driver.quit()
+                except Exception:
+                    pass
+            self.driver = None
+            self.tabs.clear()
+            self._focused = None
+
+
+_browsers = {}
+_browsers_lock = threading.Lock()
+
+
+def shared_browser(config, headless=True):
+    """The process-wide browser for this site/profile/headless combination."""
+    key = (config["site_url"], (config.get("browser") or {}).get("profile_dir"), headless)
+    with _browsers_lock:
+        browser = _browsers.get(key)
+        if browser is None:
+            browser = _browsers[key] = SharedBrowser(config, headless)
+        return browser
+
+
+def _in_tab(name):
+    parent = getattr(DialerSession, name)
+
+    def method(self, *args, **kwargs):
+        with self.browser.focus(self.handle):
+            return parent(self, *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = parent.__doc__
+    return method
+
+
+class SharedTabSession(DialerSession):
+    """DialerSession running in a tab of a SharedBrowser."""
+
+    def __init__(self, config, log, headless=True):
+        super().__init__(config, log, headless)
+        self.browser = shared_browser(config, headless)
+        self.handle = None
+
+    def _driver_alive(self) -> bool:
+        return self.handle in self.browser.tabs and self.browser.alive()
+
+    def _login(self):
+        with self.browser.lock:
+            if not self._driver_alive():
+                self.quit()
+                self.handle = self.browser.open_tab()
+                self.driver = self.browser.driver
+                if not self.browser.isolated:
+                    self.log("⚠️ مرورگر از زمینه‌های جدا پشتیبانی نمی‌کند؛ کوکی‌ها مشترک‌اند.")
+            with self.browser.focus(self.handle):
+                super()._login()
+
+    is_ready = _in_tab("is_ready")
+    dial = _in_tab("dial")
+    hangup = _in_tab("hangup")
+    _is_present = _in_tab("_is_present")  # covers call_up, wait_idle and polling
+
+    def quit(self):
+        if self.handle is not None:
+            self.browser.close_tab(self.handle)
+        self.handle = None
+        self.driver = None
+        self._elements.clear()
+
+    def _watch_outcome(self):
+        ring_timeout, off_busy_threshold, answered_grace = self._detect_params()
+        sel = self.config["selectors"]["pause_indicator"]
+        deadline = time.monotonic() + ring_timeout + off_busy_threshold + answered_grace + 5
+        try:
+            with self.browser.focus(self.handle) as driver:
+                driver.execute_script(WATCH_START_JS, sel, ring_timeout * 1000,
+                                      (off_busy_threshold + answered_grace) * 1000)
+            with span("watch_poll", session=self.name):
+                while time.monotonic() < deadline:
+                    time.sleep(POLL_SECS)
+                    with self.browser.focus(self.handle) as driver:
+                        res = driver.execute_script(WATCH_POLL_JS)
+                    if res:
+                        return self._watch_result(res)
+            raise WebDriverException("pause watcher did not finish")
+        except WebDriverException as e:
+            self.log(f"⚠️ ناظر صفحه در دسترس نیست ({e.msg}); بررسی دوره‌ای...")
+            return self._poll_outcome()
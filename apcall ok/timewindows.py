@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Calling windows.
+
+config["schedule"] = {
+    "start": "09:00", "end": "18:00",          # single window edited in the UI
+    "windows": [["09:00", "12:00"], ...],      # optional, replaces start/end
+    "categories": {"VIP": [["10:00", "20:00"]]} # optional per-category windows
+}
+A window whose start is after its end runs past midnight.  Ends are inclusive,
+like the original start <= now <= end check.  A category with an empty list
+is never open.
+"""
+
+import datetime
+import math
+
+
+def _minutes(hhmm):
+    t = datetime.datetime.strptime(hhmm.strip(), "%H:%M").time()
+    return t.hour * 60 + t.minute
+
+
+def _parse(windows):
+    return [(_minutes(s), _minutes(e)) for s, e in windows]
+
+
+class CallSchedule:
+    def __init__(self, cfg):
+        self.default = _parse(cfg.get("windows") or [[cfg["start"], cfg["end"]]])
+        self.by_category = {
+            cat: _parse(wins) for cat, wins in (cfg.get("categories") or {}).items()
+        }
+
+    def windows(self, category=None):
+        return self.by_category.get(category, self.default)
+
+    def is_open(self, category=None, now=None) -> bool:
+        now = now or datetime.datetime.now()
+        m = now.hour * 60 + now.minute
+        for s, e in self.windows(category):
+            if (s <= m <= e) if s <= e else (m >= s or m <= e):
+                return True
+        return False
+
+    def next_open(self, category=None, now=None):
+        """now if the window is open, else the datetime the next one starts.
+
+        None for a category without any window."""
+        now = now or datetime.datetime.now()
+        if self.is_open(category, now):
+            return now
+        if not self.windows(category):
+            return None
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        starts = []
+        for s, _ in self.windows(category):
+            t = today + datetime.timedelta(minutes=s)
+            starts.append(t if t > now else t + datetime.timedelta(days=1))
+        return min(starts)
+
+    def seconds_until_open(self, category=None, now=None) -> float:
+        now = now or datetime.datetime.now()
+        at = self.next_open(category, now)
+        return math.inf if at is None else (at - now).total_seconds()
+
+    def seconds_until_any_open(self, now=None) -> float:
+        now = now or datetime.datetime.now()
+        cats = [None] + list(self.by_category)
+        return min(self.seconds_until_open(c, now) for c in cats)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Opt-in span tracer writing the Chrome trace-event format, so a campaign can be
+opened in chrome://tracing or https://ui.perfetto.dev.
+
+While enabled, every Selenium interaction (driver.get, find_element(s),
+execute_(async_)script, WebElement.send_keys/click, WebDriverWait.until) is a
+span, as are the stages and waits of the dialing loop (span() calls in
+sessions.py, campaign.py, audio.py).  One span costs a couple of
+microseconds; events go to a deque and a writer thread appends them to the
+file once a second, so a long campaign never holds its trace in memory.
+When tracing is off span() returns a shared no-op and Selenium is untouched.
+
+    config["trace"] = {"file": "trace.json"}   # empty = off
+    python daemon.py --trace trace.json
+    python bench.py --trace trace.json
+
+The file is a JSON array left open while the campaign runs (the viewers
+accept that) and closed by stop().
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+_PID = os.getpid()
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "t0")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        t1 = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer._complete(self.name, self.t0, t1, self.args)
+        return False
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self._events = collections.deque()
+        self._threads = set()
+        self._file = None
+        self._first = True
+        self._stop = threading.Event()
+        self._writer = None
+        self._lock = threading.Lock()  # file writes
+
+    def start(self, path):
+        """Begin writing spans to path (truncated) and instrument Selenium."""
+        if self.enabled:
+            return
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write("[\n")
+        self._first = True
+        self._stop.clear()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+        instrument_selenium(self)
+        self.enabled = True
+
+    def stop(self):
+        """Write what is left and close the JSON array."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stop.set()
+        self._writer.join()
+        with self._lock:
+            self._drain()
+            self._file.write("\n]\n")
+            self._file.close()
+            self._file = None
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return _NULL
+        return _Span(self, name, args)
+
+    def instant(self, name, **args):
+        """A zero-length marker, e.g. a call outcome."""
+        if self.enabled:
+            t = time.perf_counter_ns()
+            self._add({"name": name, "ph": "i", "s": "t", "ts": t / 1000, "args": args})
+
+    def _complete(self, name, t0, t1, args):
+        ev = {"name": name, "ph": "X", "ts": t0 / 1000, "dur": (t1 - t0) / 1000}
+        if args:
+            ev["args"] = args
+        self._add(ev)
+
+    def _add(self, ev):
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads.add(tid)
+            self._events.append({"name": "thread_name", "ph": "M", "pid": _PID, "tid": tid,
+                                 "args": {"name": threading.current_thread().name}})
+        ev["pid"] = _PID
+        ev["tid"] = tid
+        self._events.append(ev)
+
+    def _drain(self):
+        out = []
+        try:
+            while True:
+                out.append(json.dumps(self._events.popleft(), ensure_ascii=False, default=str))
+        except IndexError:
+            pass
+        if out:
+            self._file.write(("" if self._first else ",\n") + ",\n".join(out))
+            self._file.flush()
+            self._first = False
+
+    def _write_loop(self):
+        while not self._stop.wait(1.0):
+            with self._lock:
+                self._drain()
+
+
+TRACER = Tracer()
+span = TRACER.span
+instant = TRACER.instant
+
+
+def start_from_config(config):
+    """Start TRACER if config["trace"]["file"] is set; returns the path or None."""
+    path = (config.get("trace") or {}).get("file")
+    if path:
+        TRACER.start(path)
+    return path or None
+
+
+_instrumented = False
+
+
+def instrument_selenium(tracer):
+    """Wrap the WebDriver, WebElement and WebDriverWait calls the dialer uses.
+
+    The wrappers check tracer.enabled, so after stop() they cost one attribute
+    read; Selenium is only patched once per process."""
+    global _instrumented
+    if _instrumented:
+        return
+    from selenium.webdriver.remote.webdriver import WebDriver
+    from selenium.webdriver.remote.webelement import WebElement
+    from selenium.webdriver.support.wait import WebDriverWait
+
+    def wrap(cls, method, describe=None):
+        fn = getattr(cls, method)
+        name = f"{cls.__name__}.{method}"
+
+        def traced(self, *args, **kwargs):
+            if not tracer.enabled:
+                return fn(self, *args, **kwargs)
+            with tracer.span(name, **(describe(args) if describe else {})):
+                return fn(self, *args, **kwargs)
+        traced.__wrapped__ = fn
+        setattr(cls, method, traced)
+
+    def by_value(args):
+        return {"value": args[1]} if len(args) > 1 else {}
+
+    wrap(WebDriver, "get", lambda a: {"url": a[0]} if a else {})
+    wrap(WebDriver, "find_element", by_value)
+    wrap(WebDriver, "find_elements", by_value)
+    wrap(WebDriver, "execute_script")
+    wrap(WebDriver, "execute_async_script")
+    wrap(WebDriver, "set_script_timeout")
+    wrap(WebElement, "send_keys")
+    wrap(WebElement, "click")
+    wrap(WebDriverWait, "until")
+    _instrumented = True
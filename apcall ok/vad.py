@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Answer analysis on the line audio: was an answered call picked up by a
+person, a voicemail greeting or a network announcement?
+
+The first few seconds after the pause indicator appears are cut into 20 ms
+frames and every frame gets three features at once (one rfft over all of
+them):
+  energy    RMS level in dBFS, compared with the window's own noise floor
+  tonality  share of the spectrum in the strongest peak: high for the beeps
+            and special-information tones in front of operator messages,
+            low for speech
+  zcr       zero-crossing rate, to drop hiss that is loud but not voiced
+
+Frames loud above the floor and not tonal are voice.  Gaps shorter than
+HANGOVER_S are bridged.  Then:
+  tone frames >= TONE_MIN_S              -> "announcement"
+  no voice                               -> "silence" (left as answered)
+  a voice run of voicemail_s or longer   -> "voicemail" (a recorded greeting
+                                            talks for seconds without the
+                                            pause a person leaves for a reply)
+  anything else                          -> "human"
+Hanging up on a person loses the call, so everything unclear – a long
+"الو، بله، بفرمایید؟", speech still running when the window ends – stays
+"human".  window must be at least voicemail_s for "voicemail" to be possible.
+
+    python vad.py fixtures/*.wav      # verdict and features per file
+
+fixtures/ holds short synthetic 8 kHz recordings named after the verdict
+they must get (human_quiet.wav -> "human"); `python selfcheck.py vad`
+checks all of them.
+"""
+
+import sys
+import wave
+
+import numpy as np
+
+FRAME_S = 0.02
+HANGOVER_S = 0.1
+TONE_MIN_S = 0.2
+TONALITY = 0.5  # a clean tone puts ~90% of a Hann-windowed frame in 3 bins
+VOICE_DB = 10.0  # above the noise floor
+MIN_DB = -50.0  # quieter frames are never voice or tone
+LOUD_DB = -35.0  # frames above this are loud whatever the floor
+ZCR_MAX = 0.45  # voiced speech stays well under; white noise is ~0.5
+
+VERDICTS = ("human", "voicemail", "announcement", "silence")
+
+
+def to_float(pcm) -> np.ndarray:
+    """int16 (or float) samples as float32 in [-1, 1]."""
+    a = np.asarray(pcm)
+    if a.dtype.kind in "iu":
+        return a.astype(np.float32) / 32768.0
+    return a.astype(np.float32)
+
+
+def frame_features(samples, rate, frame_s=FRAME_S):
+    """(db, tonality, zcr), one value per whole frame; a partial last frame is dropped."""
+    x = to_float(samples)
+    n = int(rate * frame_s)
+    count = len(x) // n
+    if not count:
+        empty = np.empty(0, dtype=np.float32)
+        return empty, empty, empty
+    frames = x[:count * n].reshape(count, n)
+
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    db = 20 * np.log10(rms + 1e-9)
+
+    power = np.abs(np.fft.rfft(frames * np.hanning(n), axis=1)) ** 2
+    power[:, 0] = 0.0  # ignore DC
+    peak = power.argmax(axis=1)
+    rows = np.arange(count)
+    last = power.shape[1] - 1
+    around = (power[rows, peak] + power[rows, np.maximum(peak - 1, 0)]
+              + power[rows, np.minimum(peak + 1, last)])
+    tonality = around / (power.sum(axis=1) + 1e-12)
+
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (n - 1)
+    return db, tonality, zcr
+
+
+def _bridge(mask, gap):
+    """Fill runs of False no longer than gap frames between True frames."""
+    out = mask.copy()
+    idx = np.flatnonzero(mask)
+    if len(idx) > 1:
+        d = np.diff(idx)
+        for i in np.flatnonzero((d > 1) & (d <= gap + 1)):
+            out[idx[i]:idx[i + 1]] = True
+    return out
+
+
+def _runs(mask):
+    """(start, end) frame index pairs of the True runs."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def classify(samples, rate, window=3.0, voicemail_s=2.5):
+    """Verdict on the first window seconds after the answer.
+
+    Returns {"verdict", "voice_s", "tone_s", "longest_voice_s", "floor_db"}."""
+    x = np.asarray(samples)[:int(rate * window)]
+    db, tonality, zcr = frame_features(x, rate)
+    info = {"verdict": "silence", "voice_s": 0.0, "tone_s": 0.0,
+            "longest_voice_s": 0.0, "floor_db": None}
+    if not len(db):
+        return info
+
+    floor = float(np.percentile(db, 10))
+    # relative to the floor, but a window that is all speech has its floor
+    # inside the speech: never ask for more than LOUD_DB
+    loud = db > max(MIN_DB, min(floor + VOICE_DB, LOUD_DB))
+    tone = (db > MIN_DB) & (tonality >= TONALITY)
+    voice = _bridge(loud & ~tone & (zcr < ZCR_MAX), int(HANGOVER_S / FRAME_S))
+
+    runs = _runs(voice)
+    longest = max((e - s for s, e in runs), default=0) * FRAME_S
+    info.update(voice_s=float(voice.sum() * FRAME_S), tone_s=float(tone.sum() * FRAME_S),
+                longest_voice_s=float(longest), floor_db=floor)
+
+    if info["tone_s"] >= TONE_MIN_S:
+        info["verdict"] = "announcement"
+    elif not runs:
+        info["verdict"] = "silence"
+    elif longest >= voicemail_s:
+        info["verdict"] = "voicemail"
+    else:
+        info["verdict"] = "human"
+    return info
+
+
+def read_wav(path):
+    """(mono int16 samples, rate) of a PCM WAV file."""
+    with wave.open(path, "rb") as w:
+        rate, channels, width = w.getframerate(), w.getnchannels(), w.getsampwidth()
+        raw = w.readframes(w.getnframes())
+    if width == 1:
+        a = (np.frombuffer(raw, dtype=np.uint8).astype(np.int16) - 128) << 8
+    elif width == 2:
+        a = np.frombuffer(raw, dtype="<i2")
+    elif width == 4:
+        a = (np.frombuffer(raw, dtype="<i4") >> 16).astype(np.int16)
+    else:
+        raise ValueError(f"unsupported sample width: {width}")
+    if channels > 1:
+        a = a.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return a, rate
+
+
+def classify_wav(path, **kwargs):
+    samples, rate = read_wav(path)
+    return classify(samples, rate, **kwargs)
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit("usage: python vad.py FILE.wav...")
+    for path in sys.argv[1:]:
+        r = classify_wav(path)
+        floor = "-" if r["floor_db"] is None else f"{r['floor_db']:.0f}"
+        print(f"{path}: {r['verdict']} (voice {r['voice_s']:.2f}s, longest {r['longest_voice_s']:.2f}s, "
+              f"tone {r['tone_s']:.2f}s, floor {floor} dB)")
+
+
+if __name__ == "__main__":
+    main()
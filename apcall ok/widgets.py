@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tk widgets for large contact lists.
+VirtualListbox keeps only the rows that fit on screen inside a tk.Listbox and
+asks row_text(i) for them on demand, so 100k contacts cost no more to show
+than 30.  Selection is tracked by absolute row number.
+"""
+
+import tkinter as tk
+from tkinter import ttk
+import tkinter.font as tkfont
+
+
+class VirtualListbox(ttk.Frame):
+    def __init__(self, master, row_text, **kw):
+        super().__init__(master)
+        self.row_text = row_text
+        self.count = 0
+        self.top = 0
+        self.selected = set()
+        self.anchor = None
+
+        self.lb = tk.Listbox(self, activestyle="none", exportselection=False, **kw)
+        self.lb.pack(side="left", fill="both", expand=True)
+        self.sb = ttk.Scrollbar(self, command=self._on_scroll)
+        self.sb.pack(side="right", fill="y")
+
+        self.lb.bind("<Configure>", lambda e: self._render())
+        self.lb.bind("<MouseWheel>", self._on_wheel)
+        self.lb.bind("<Button-4>", lambda e: self._scroll_by(-3))
+        self.lb.bind("<Button-5>", lambda e: self._scroll_by(3))
+        self.lb.bind("<Button-1>", lambda e: self._on_click(e, "set"))
+        self.lb.bind("<Control-Button-1>", lambda e: self._on_click(e, "toggle"))
+        self.lb.bind("<Shift-Button-1>", lambda e: self._on_click(e, "range"))
+        self.lb.bind("<B1-Motion>", lambda e: "break")
+        self.lb.bind("<Up>", lambda e: self._move(-1))
+        self.lb.bind("<Down>", lambda e: self._move(1))
+        self.lb.bind("<Prior>", lambda e: self._scroll_by(-self._rows()))
+        self.lb.bind("<Next>", lambda e: self._scroll_by(self._rows()))
+        self.lb.bind("<Control-a>", self._select_all)
+
+    # ---- model ----
+    def set_count(self, n):
+        """Point the view at a new row model of n rows."""
+        self.count = n
+        self.top = 0
+        self.selected.clear()
+        self.anchor = None
+        self._render()
+
+    def refresh_row(self, i):
+        """Re-render row i if it is on screen."""
+        pos = i - self.top
+        if 0 <= pos < self.lb.size():
+            self.lb.delete(pos)
+            self.lb.insert(pos, self.row_text(i))
+            if i in self.selected:
+                self.lb.selection_set(pos)
+
+    def curselection(self):
+        return sorted(self.selected)
+
+    # ---- rendering ----
+    def _rows(self):
+        line = tkfont.nametofont(self.lb.cget("font")).metrics("linespace") + 1
+        return max(1, self.lb.winfo_height() // line)
+
+    def _render(self):
+        rows = self._rows()
+        self.top = max(0, min(self.top, self.count - rows))
+        end = min(self.count, self.top + rows)
+        self.lb.delete(0, tk.END)
+        if end > self.top:
+            self.lb.insert(tk.END, *(self.row_text(i) for i in range(self.top, end)))
+        for i in range(self.top, end):
+            if i in self.selected:
+                self.lb.selection_set(i - self.top)
+        if self.count:
+            self.sb.set(self.top / self.count, end / self.count)
+        else:
+            self.sb.set(0, 1)
+
+    def _scroll_by(self, n):
+        self.top += n
+        self._render()
+        return "break"
+
+    def _on_scroll(self, *args):
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * self.count)
+        elif args[0] == "scroll":
+            step = self._rows() if args[2] == "pages" else 1
+            self.top += int(args[1]) * step
+        self._render()
+
+    def _on_wheel(self, event):
+        return self._scroll_by(-3 * int(event.delta / 120) if event.delta else 0)
+
+    # ---- selection ----
+    def _on_click(self, event, mode):
+        self.lb.focus_set()
+        if not self.count:
+            return "break"
+        i = min(self.top + self.lb.nearest(event.y), self.count - 1)
+        if mode == "toggle":
+            self.selected ^= {i}
+            self.anchor = i
+        elif mode == "range" and self.anchor is not None:
+            lo, hi = sorted((self.anchor, i))
+            self.selected = set(range(lo, hi + 1))
+        else:
+            self.selected = {i}
+            self.anchor = i
+        self._render()
+        return "break"
+
+    def _move(self, step):
+        if not self.count:
+            return "break"
+        i = 0 if self.anchor is None else max(0, min(self.count - 1, self.anchor + step))
+        self.selected = {i}
+        self.anchor = i
+        rows = self._rows()
+        if i < self.top:
+            self.top = i
+        elif i >= self.top + rows:
+            self.top = i - rows + 1
+        self._render()
+        return "break"
+
+    def _select_all(self, event=None):
+        self.selected = set(range(self.count))
+        self._render()
+        return "break"
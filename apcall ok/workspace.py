@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+The contact list one dialer instance works on, shared by the Tk app (999.py)
+and the headless daemon (daemon.py): the indexed store with its lock, the
+crash-safe journal, the CDR store and the do-not-call index, plus the two
+flows both front ends run the same way – merging an imported list into the
+store and handling a call outcome (mark, journal, audio or hang-up, CDR).
+
+Front-end specifics come in as arguments: a log function, how to play the
+message into a call and who is expected to hang up an answered call.
+"""
+
+import threading
+import time
+
+from cdr import CdrStore, call_record
+from contacts import ContactStore
+from dnc import DncIndex
+from importer import MERGE_REPORT, dedupe_contacts, save_merge_report
+from journal import ContactJournal
+
+CONTACTS_FILE = "contacts.pkl"
+JOURNAL_FILE = "contacts_journal.db"
+
+
+class Workspace:
+    def __init__(self, config, log, contacts_file=CONTACTS_FILE, journal_file=JOURNAL_FILE):
+        self.log = log
+        self.store = ContactStore()
+        self.lock = threading.Lock()  # guards store; marks must precede journal.record
+        self.journal = ContactJournal(contacts_file, journal_file, snapshot=self.frame)
+        self.cdr = CdrStore()
+        threading.Thread(target=self.cdr.compact, daemon=True).start()
+        self.dnc = DncIndex(config["dnc"]["file"], config["dnc"]["bloom"])
+
+    def frame(self):
+        with self.lock:
+            return self.store.to_frame()
+
+    def load_saved(self) -> bool:
+        """Restore the stored list with its journaled outcomes; False if there is none."""
+        df = self.journal.load()
+        if df is None:
+            return False
+        with self.lock:
+            self.store.load(df)
+        self.log(f"📥 لیست مخاطبین از حافظه بارگذاری شد ({len(self.store)} مخاطب).")
+        return True
+
+    # ---- import ----
+    def add_contacts(self, df, digest, cached=False):
+        """Merge an importer.import_contacts() result into the list.
+
+        Drops do-not-call numbers and repeats, resets the journal to the new
+        list and logs what happened; returns the counts."""
+        if digest == self.journal.list_hash():
+            self.log("ℹ️ این فایل قبلاً بارگذاری شده است؛ وضعیت تماس‌ها حفظ شد.")
+            return {"contacts": len(self.store), "unchanged": True}
+
+        rejected = df.attrs.get("rejected", 0)
+        if rejected:
+            self.log(f"⚠️ {rejected} ردیف شماره موبایل معتبر ایران نداشت و کنار گذاشته شد.")
+        if 'Called' not in df.columns:
+            df['Called'] = False
+        for col in ('Outcome', 'CalledAt'):
+            if col not in df.columns:
+                df[col] = None
+        df, blocked = self.dnc.filter(df)
+        if blocked:
+            self.log(f"🚫 {blocked} شماره در فهرست عدم تماس بود و حذف شد.")
+
+        with self.lock:
+            df, merged = dedupe_contacts(df, self.store.phones)
+            self.store.append(df)
+            self.journal.reset(self.store.to_frame(), digest)
+        src = " (از حافظه پنهان)" if cached else ""
+        self.log(f"📥 {len(df)} مخاطب جدید اضافه شد{src} (مجموع {len(self.store)}).")
+        if len(merged):
+            dup, existing = save_merge_report(merged)
+            self.log(
+                f"🔗 {len(merged)} شماره ادغام شد ({dup} تکراری در فایل، "
+                f"{existing} از قبل در لیست)؛ جزئیات در {MERGE_REPORT}"
+            )
+        return {"contacts": len(self.store), "added": len(df), "merged": len(merged),
+                "blocked": blocked, "rejected": rejected, "unchanged": False}
+
+    # ---- calls ----
+    def run_campaign(self, engine, contacts):
+        """engine.run(contacts); the resume queue is dropped once it ran to the end."""
+        engine.run(contacts)
+        if not engine.stop_event.is_set():
+            self.journal.finish_campaign()
+
+    def record(self, contact, outcome):
+        """Mark the contact and queue the outcome for the journal; returns the store rows."""
+        ts = time.time()
+        final = outcome.get("redial_in") is None
+        with self.lock:
+            rows = self.store.mark(contact["number"], outcome["status"], ts)
+            self.journal.record(contact["number"], outcome["status"], outcome["duration"], ts,
+                                final, outcome.get("attempt", 1),
+                                None if final else ts + outcome["redial_in"])
+        return rows
+
+    def finish_call(self, session, contact, outcome, play=None, hangup_by=""):
+        """Act on a recorded outcome, then write its CDR; returns whether audio played.
+
+        play(session) plays the message into an answered call (True if it
+        played to the end); without it the call is held until hang-up,
+        which hangup_by names in the log."""
+        status, dur = outcome["status"], outcome["duration"]
+        played = False
+        if status == "answered":
+            if play is not None:
+                played = play(session)
+                if played:
+                    session.log(f"🎯 نتیجه تماس: وصل شد (~{dur:.1f}s).")
+                else:
+                    session.log("🔇 تماس پیش از پایان پیام قطع شد.")
+            else:
+                session.log(f"☎️ تماس برقرار شد؛ منتظر قطع {hangup_by}...")
+                session.wait_for_hangup()
+                session.log("🔌 تماس قطع شد.")
+
+        elif status in ("voicemail", "announcement"):
+            session.hangup()
+            session.log("📼 پیام‌گیر/اعلان شبکه پاسخ داد؛ تماس قطع شد.")
+
+        elif status == "ended_after_answer":
+            session.log(f"🟡 تماس وصل شد اما زود قطع شد (~{dur:.1f}s).")
+
+        elif status == "powered_off_or_busy":
+            session.log(f"🔴 خاموش/مشغول (~{dur:.1f}s).")
+
+        else:
+            session.log("⚫ بی‌پاسخ/خارج‌دسترس.")
+
+        self.cdr.add(call_record(session.name, contact, outcome, played))
+        return played
+
+    def close(self):
+        self.journal.flush()
+        self.cdr.close()